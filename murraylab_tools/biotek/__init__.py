@@ -1,13 +1,28 @@
 __all__ = ['biotek']
 from .biotek import calibration_data, \
+                    calibration_table, \
+                    CalibrationTable, \
                     calibration_data_df, \
                     raw_to_uM, \
                     tidy_biotek_data, \
+                    tidy_biotek_df, \
+                    iter_biotek_blocks, \
+                    tidy_many, \
+                    TidyCache, \
+                    BiotekTailer, \
+                    index_biotek_file, \
+                    read_channel, \
+                    BiotekStore, \
+                    read_tidy_biotek_data, \
+                    compact_tidy_df, \
+                    PlateCube, \
                     background_subtract, \
                     endpoint_averages, \
                     window_averages, \
                     spline_fit, \
+                    moving_average_fit, \
                     smoothed_derivatives, \
+                    savgol_fit, \
                     read_supplementary_info, \
                     extract_trajectories_only, \
                     normalize, \
@@ -17,6 +32,7 @@ from .biotek import calibration_data, \
                     hmap_plt, \
                     applyFunc, \
                     summarize_growth, \
-                    logistic_growth
+                    logistic_growth, \
+                    apply_by_well
 
 
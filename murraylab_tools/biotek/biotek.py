@@ -6,19 +6,26 @@
 
 import sys
 import collections
+import concurrent.futures
 import pandas as pd
 import numpy as np
 import warnings
 import scipy.interpolate
+import scipy.signal
 import csv
 import os
+import json
+import pickle
+import hashlib
+import sqlite3
 import math
+import re
 import matplotlib.pyplot as plt
 import seaborn as sns
 from collections import namedtuple
 from ..utils import *
 import pkg_resources
-from datetime import datetime
+from datetime import datetime, timedelta, time as clock_time
 from copy import deepcopy as dc
 
 ####################
@@ -68,44 +75,34 @@ def calibration_dates(filename = None):
         date_dict[fluor] = df[df.Fluorophore == fluor].Date.unique()
     return date_dict
 
-def calibration_data(date = None, filename = None):
+def _calibration_dict_from_file(date = None, filename = None):
     '''
-    Returns calibration data for the bioteks in the form of a nested dictionary:
-        fluorophore -> {biotek -> {gain -> AFU/uM}}
-
-    Params:
-        date: Date of calibration data you would like to use, as a string of the
-                form "MM/DD/YY" (e.g. 06/23/18). Defaults to None, in which case
-                the latest date of calibration for each fluorophore is used.
-        filename: The name of the (CSV) file to read calibration data from.
-                    Default None, in which case data is loaded from a
-                    package-distributed data file.
-    Returns: A nested dictionary containing calibration data from a single date,
-                or the most recent calibration data.
+    Reads calibration data from file and converts it to the nested dictionary
+    form returned by calibration_data.
     '''
     df = calibration_data_df(filename)
     if date is not None:
         data_df = df[df.Date == date]
-        if len(df) == 0:
+        if len(data_df) == 0:
             raise Warning("No calibration data found on date %s." % date)
     else:
-        data_list = []
-        for fluor in df.Fluorophore.unique():
-            fluor_df = df[df.Fluorophore == fluor]
-            dates = list(map(lambda d: datetime.strptime(d, "%m/%d/%y").date(),
-                             fluor_df.Date))
-            most_recent_date = max(dates).strftime("%m/%d/%y")
-            data_list.append(fluor_df[fluor_df.Date == most_recent_date])
-        data_df = pd.concat(data_list)
+        # Keep only the most recent calibration of each fluorophore, grouped
+        # by fluorophore in order of first appearance.
+        dates = pd.to_datetime(df.Date, format = "%m/%d/%y")
+        most_recent = dates.groupby(df.Fluorophore).transform("max")
+        fluor_order = df.Fluorophore.map(dict((f, i) for i, f in \
+                                         enumerate(df.Fluorophore.unique())))
+        data_df = df[dates == most_recent]
+        data_df = data_df.iloc[np.argsort(fluor_order[dates == most_recent]\
+                                          .to_numpy(), kind = "mergesort")]
 
     # Convert data to dictionary form.
     calibration_dict = dict()
-    for index, row in data_df.iterrows():
-        fluor = row.Fluorophore
-        date  = row.Date
-        bt    = 'b' + str(row.Biotek)
-        gain  = row.Gain
-        AFU   = row["AFU per uM"]
+    for fluor, date, biotek, gain, AFU in zip(data_df.Fluorophore,
+                                              data_df.Date, data_df.Biotek,
+                                              data_df.Gain,
+                                              data_df["AFU per uM"]):
+        bt = 'b' + str(biotek)
         if fluor not in calibration_dict:
             calibration_dict[fluor] = dict()
             calibration_dict[fluor]["date"] = date
@@ -114,9 +111,144 @@ def calibration_data(date = None, filename = None):
         calibration_dict[fluor][bt][gain] = AFU
     return calibration_dict
 
+class CalibrationTable(object):
+    '''
+    Calibration data indexed for fast lookup. Channel names are resolved
+    case-insensitively up front, and AFU/uM values are kept in a flat
+    dictionary keyed by (fluorophore, biotek, gain).
+
+    Usually made by calibration_table, which caches tables by file and date.
+    Anywhere a calibration dictionary is accepted, a CalibrationTable can be
+    used instead.
+    '''
+
+    def __init__(self, calibration_dict):
+        '''
+        Params:
+            calibration_dict: A nested dictionary of calibration data, as
+                                returned by calibration_data().
+        '''
+        self.calibration_dict = calibration_dict
+        self.channel_names    = dict()
+        self.factors          = dict()
+        for fluor, bioteks in calibration_dict.items():
+            self.channel_names.setdefault(fluor.upper(), fluor)
+            for bt, gains in bioteks.items():
+                if bt == "date":
+                    continue
+                for gain, AFU in gains.items():
+                    self.factors[(fluor, bt, gain)] = AFU
+
+    @property
+    def version(self):
+        '''
+        A hash of the calibration data, which changes whenever any of it does.
+        '''
+        if getattr(self, "_version", None) is None:
+            factors = sorted(self.factors.items(), key = repr)
+            self._version = hashlib.sha256(repr(factors).encode()).hexdigest()
+        return self._version
+
+    def standard_channel_name(self, fp_name, suppress_name_warning = False):
+        '''
+        Finds the calibrated channel name matching fp_name (ignoring case).
+        '''
+        name = self.channel_names.get(fp_name.upper())
+        if name is not None:
+            return name
+        if not suppress_name_warning:
+            warnings.warn(("Unable to convert channel %s into standard " + \
+                           "channel name. Are you sure this is the right " + \
+                           "name?") % fp_name)
+        return fp_name
+
+    def factor(self, protein, biotek, gain):
+        '''
+        Returns AFU per uM for a channel, or None if it isn't calibrated. See
+        calibration_factor.
+        '''
+        protein = self.standard_channel_name(protein)
+        return self.factors.get((protein, biotek, gain))
+
+    def to_uM(self, raw, protein, biotek, gain, volume):
+        '''
+        Converts an array of AFU measurements (in TX-TL) to uM, in one go.
+
+        Params:
+            raw: An array (of any shape) of AFU fluorescence readings, as
+                    numbers or strings. "OVRFLW" readings are converted to inf.
+            protein, biotek, gain, volume: See raw_to_uM.
+        Returns: An array of uM measurements, or None if the channel isn't
+                    calibrated.
+        '''
+        AFU_per_uM = self.factor(protein, biotek, gain)
+        if AFU_per_uM is None:
+            return None
+        raw = np.asarray(raw)
+        if raw.dtype.kind in "OSU":
+            raw = raw.astype(str)
+            raw = np.where(np.char.upper(raw) == "OVRFLW", "inf", raw)
+        # Note that volume is in uL!
+        return raw.astype(float) * 10.0 / AFU_per_uM / volume
+
+_calibration_tables = dict()
+
+def calibration_table(date = None, filename = None):
+    '''
+    Returns calibration data as a CalibrationTable. Tables are cached, so
+    calling this again with the same date and file (as long as that file
+    hasn't been modified) doesn't re-read anything.
+
+    Params:
+        date: Date of calibration data you would like to use. See
+                calibration_data.
+        filename: The name of the (CSV) file to read calibration data from.
+                    Default None, in which case data is loaded from a
+                    package-distributed data file.
+    Returns: A CalibrationTable.
+    '''
+    if filename is None:
+        filename = pkg_resources.resource_filename('murraylab_tools',
+                                   os.path.join('data', 'calibration_data.csv'))
+    filename = os.path.abspath(filename)
+    key = (filename, os.path.getmtime(filename), date)
+    if not key in _calibration_tables:
+        _calibration_tables[key] = \
+            CalibrationTable(_calibration_dict_from_file(date, filename))
+    return _calibration_tables[key]
+
+def _as_calibration_table(calibration):
+    '''
+    Wraps a calibration dictionary in a CalibrationTable, if it isn't one
+    already.
+    '''
+    if isinstance(calibration, CalibrationTable):
+        return calibration
+    return CalibrationTable(calibration)
+
+def calibration_data(date = None, filename = None):
+    '''
+    Returns calibration data for the bioteks in the form of a nested dictionary:
+        fluorophore -> {biotek -> {gain -> AFU/uM}}
+
+    Params:
+        date: Date of calibration data you would like to use, as a string of the
+                form "MM/DD/YY" (e.g. 06/23/18). Defaults to None, in which case
+                the latest date of calibration for each fluorophore is used.
+        filename: The name of the (CSV) file to read calibration data from.
+                    Default None, in which case data is loaded from a
+                    package-distributed data file.
+    Returns: A nested dictionary containing calibration data from a single date,
+                or the most recent calibration data.
+    '''
+    return dc(calibration_table(date, filename).calibration_dict)
+
 
 def standard_channel_name(fp_name, calibration_dict,
                           suppress_name_warning = False):
+    if isinstance(calibration_dict, CalibrationTable):
+        return calibration_dict.standard_channel_name(fp_name,
+                                                      suppress_name_warning)
     upper_name = fp_name.upper()
     all_names  = calibration_dict.keys()
     for name in all_names:
@@ -133,7 +265,7 @@ def raw_to_uM(calibration_dict, raw, protein, biotek, gain, volume):
 
     Params:
         calibration_dict: A nested dictionary of calibration data, as returned
-                            by calibration_data().
+                            by calibration_data(), or a CalibrationTable.
         raw: An AFU fluorescence reading.
         protein: Name of the fluorescent protein or channel. Must match a
                     channel name in calibration_data, but isn't case-sensitive.
@@ -141,328 +273,2247 @@ def raw_to_uM(calibration_dict, raw, protein, biotek, gain, volume):
         gain: Gain used. Usually should be 61 or 100.
         volume: Volume of the TX-TL reaction.
     '''
+    AFU_per_uM = calibration_factor(calibration_dict, protein, biotek, gain)
+    if AFU_per_uM is None:
+       return None
+    # Note that volume is in uL!
+    if raw == "OVRFLW":
+        raw = np.infty
+    return float(raw) * 10.0 / AFU_per_uM / volume
+
+def calibration_factor(calibration_dict, protein, biotek, gain):
+    '''
+    Look up the AFU/uM calibration for a single channel, if there is one.
+
+    Params:
+        calibration_dict: A nested dictionary of calibration data, as returned
+                            by calibration_data(), or a CalibrationTable.
+        protein: Name of the fluorescent protein or channel. Isn't
+                    case-sensitive.
+        biotek: Name of the biotek used, e.g. 'b3'.
+        gain: Gain used.
+    Returns: AFU per uM for that channel, or None if the channel isn't
+                calibrated.
+    '''
+    if isinstance(calibration_dict, CalibrationTable):
+        return calibration_dict.factor(protein, biotek, gain)
     protein = standard_channel_name(protein, calibration_dict)
     if not protein in calibration_dict or \
        not biotek in calibration_dict[protein] or \
        not gain in calibration_dict[protein][biotek]:
        return None
-    # Note that volume is in uL!
-    if raw == "OVRFLW":
-        raw = np.infty
-    return float(raw) * 10.0 / calibration_dict[protein][biotek][gain] / volume
+    return calibration_dict[protein][biotek][gain]
+
+ReadSet = collections.namedtuple('ReadSet', ['name', 'excitation', 'emission',
+                                             'gain'])
+
+tidy_file_formats = ["csv", "parquet", "feather"]
+
+BlockProperties = collections.namedtuple('BlockProperties',
+                                         ['read_name', 'reading_OD',
+                                          'excitation', 'emission', 'gain'])
+
+def read_supplementary_info(input_filename):
+    info = dict()
+    with mt_open(input_filename, 'r') as infile:
+        reader = csv.reader(infile)
+        title_line = next(reader)
+        title_line = list(map(lambda s:s.strip(), title_line))
+        for i in range(1, len(title_line)):
+            info[title_line[i]] = dict()
+        for line in reader:
+            line = list(map(lambda s:s.strip(), line))
+            if line[0].strip() == "":
+                continue
+            for i in range(1, len(title_line)):
+                info[title_line[i]][line[0]] = line[i]
+    return info
+
+
+def _read_supplementary_df(input_filename):
+    '''
+    Reads a supplementary file (see read_supplementary_info) into a DataFrame
+    of strings indexed by well, with one column per metadata field. If a well
+    is listed more than once, its last row is used.
+    '''
+    with mt_open(input_filename, 'r') as infile:
+        reader = csv.reader(infile)
+        title_line = [s.strip() for s in next(reader)]
+        rows = []
+        for line in reader:
+            line = [s.strip() for s in line]
+            if len(line) == 0 or line[0] == "":
+                continue
+            rows.append(line[:len(title_line)] \
+                        + [""] * (len(title_line) - len(line)))
+    info = pd.DataFrame(rows, columns = title_line, dtype = object)
+    info = info.drop_duplicates(title_line[0], keep = "last")
+    return info.set_index(title_line[0])
+
+
+def _warn_dropped_wells(dropped_wells):
+    '''
+    Warns (once) about wells thrown out for lack of supplementary data.
+    '''
+    if len(dropped_wells) > 0:
+        warnings.warn(("No supplementary data for %d well(s) (%s); throwing " \
+                       + "out data for those wells.") \
+                      % (len(dropped_wells), ", ".join(dropped_wells)))
+
+
+def _read_biotek_header(reader, override_plate_reader_id = None):
+    '''
+    Reads the header of a Biotek output file, up to the first data block.
+
+    Basic reading flow looks like:
+      1) Read lines until a line that reads "Read", recording information
+          about plate reader ID.
+      2) For each line until the next line that reads "Layout":
+          2.1) Look for a line starting with "Filter Set:"
+          2.2) Get read set information from next two lines, store it.
+
+    Arguments:
+        --reader: A csv reader (or any iterator of lists of strings) positioned
+                    at the start of the file.
+        --override_plate_reader_id: If not None, the plate reader ID will be
+                                        set to this. Default None.
+    Returns: A tuple (plate_reader_id, read_sets, line), where read_sets is a
+                dictionary mapping read names to lists of ReadSets and line is
+                the first line after the header (or None if the file ended).
+    '''
+    plate_reader_id = override_plate_reader_id
+    read_sets = dict()
+    next_line = ""
+    line      = None
+    while True:
+        if next_line != "":
+            line = next_line
+            next_line = ""
+        else:
+            try:
+                line = next(reader)
+            except StopIteration:
+                line = None
+                break
+        if len(line) == 0:
+            continue
+        if line[0].strip() == "Reader Serial Number:":
+            if override_plate_reader_id != None:
+                    warnings.warn(("Plate reader id overridden to be '%s'") \
+                            % override_plate_reader_id)
+                    plate_reader_id = override_plate_reader_id
+            elif line[1] in plate_reader_ids:
+                plate_reader_id = plate_reader_ids[line[1]]
+            else:
+                warnings.warn(("Unknown plate reader id '%s'; will " + \
+                              "not attempt to calculate molarity "   + \
+                              "concentrations.") % line[1])
+                plate_reader_id = None
+            continue
+        if line[0].strip() == "Read":
+            if line[1].strip() == "Fluorescence Endpoint":
+                read_name = ""
+            else:
+                read_name = line[1].strip()
+            entered_layout = False
+            hit_data       = False
+
+            # Process all the information for this read set into one
+            # solid text block, which we will search for relevant
+            # information
+            read_information_block = ""
+            for line in reader:
+                if len(line) == 0:
+                    continue
+                if line[0].strip() == "Layout":
+                    entered_layout = True
+                    break
+                maybe_read_name = line[0].split(":")[0].strip()
+                if maybe_read_name in read_sets.keys() or \
+                   maybe_read_name.startswith("OD"):
+                    hit_data = True
+                    break
+                if line[0].strip() == "Read":
+                    next_line = line
+                    break
+                line[-1] = line[-1].strip()
+                read_information_block += ",".join(line)
+
+            # Now go through the block to figure out information for the
+            # read set.
+            info_parts = read_information_block.split(",")
+            for idx in range(len(info_parts)):
+                block = info_parts[idx]
+                block = block.strip()
+                if block.startswith("Wavelengths"):
+                    emission = int(block.split(":")[-1].strip()\
+                                   .split("/")[0].strip())
+                    excitation = emission
+                if block.startswith("Filter Set"):
+                    for i in range(idx+1, len(info_parts)):
+                        sub_block = info_parts[i]
+                        sub_block = sub_block.strip()
+                        if sub_block.startswith("Excitation"):
+                            excitation = int(sub_block.split(":")[-1]\
+                                             .split("/")[0].strip())
+                        if sub_block.startswith("Emission"):
+                            emission = int(sub_block.split(":")[-1]\
+                                             .split("/")[0].strip())
+                        if sub_block.startswith("Gain"):
+                            gain = sub_block.split(",")[-1]\
+                                   .split(":")[-1].strip()
+                            if gain != "AutoScale":
+                                gain = int(gain)
+                        if sub_block.startswith("Filter Set"):
+                            break
+                    if not read_name in read_sets:
+                        read_sets[read_name] = []
+                    read_sets[read_name].append(ReadSet(read_name,
+                                                    excitation,
+                                                    emission, gain))
+            if entered_layout or hit_data:
+                break
+    return plate_reader_id, read_sets, line
+
+
+class _UnfinishedHeader(Exception):
+    '''
+    Raised when a file's header hasn't been fully written yet.
+    '''
+    pass
+
+
+def _read_header_lines(lines, override_plate_reader_id = None, final = True):
+    '''
+    Parses the header at the start of a list of lines (see
+    _read_biotek_header).
+
+    Arguments:
+        --lines: List of lines, each a list of cells.
+        --override_plate_reader_id: See _read_biotek_header.
+        --final: If False, lines may stop partway through the header (e.g., for
+                    a file that's still being written), in which case None is
+                    returned instead of parsing a partial header. Default
+                    True.
+    Returns: A tuple (plate_reader_id, read_sets, n_header), where
+                lines[n_header] is the first line after the header, or None if
+                there are no lines after the header.
+    '''
+    consumed = [0]
+    def counting_reader():
+        for line in lines:
+            consumed[0] += 1
+            yield line
+        if not final:
+            raise _UnfinishedHeader()
+    try:
+        plate_reader_id, read_sets, line = \
+            _read_biotek_header(counting_reader(), override_plate_reader_id)
+    except _UnfinishedHeader:
+        return None
+    if line is None:
+        return None
+    # The header reader stops on (and consumes) the first line after the
+    # header.
+    return plate_reader_id, read_sets, consumed[0] - 1
+
+
+def _block_properties(info, read_sets):
+    '''
+    Figures out channel name, wavelengths and gain for a data block from the
+    first line of that block (e.g. "GFP:485,528[2]") and the read sets parsed
+    out of the file header.
+    '''
+    if info.upper().startswith("OD"):
+        read_name  = info.split(":")[0].strip()
+        excitation = int(info.split(":")[1])
+        return BlockProperties(read_name, True, excitation, -1, -1)
+
+    if ":" in info:
+        info_parts = info.split(":")
+        read_name  = info_parts[0]
+    else:
+        info_parts = [info]
+        read_name = ""
+    if not info.endswith(']'):
+        read_idx = 0
+    else:
+        read_idx = int(info.split('[')[-1][:-1]) - 1
+    read_properties = read_sets[read_name][read_idx]
+    gain            = read_properties.gain
+    if len(info_parts) > 1:
+        excitation = info_parts[1].split("[")[0].split(",")[0]
+        excitation = int(excitation)
+        emission   = info_parts[1].split("[")[0].split(",")[1]
+        emission   = int(emission)
+    else:
+        excitation      = read_properties.excitation
+        emission        = read_properties.emission
+    return BlockProperties(read_name, False, excitation, emission, gain)
+
+
+def _read_data_block(reader):
+    '''
+    Reads the lines of a single data block, starting just after the line naming
+    the block and ending with (and consuming) the blank line after the last
+    timepoint.
+
+    Returns: A tuple (well_names, data_lines), where well_names is the chart
+                title line and data_lines is a list of lines of raw data.
+    '''
+    next(reader)              # Skip a line
+    well_names = next(reader) # Chart title line
+    data_lines = []
+    for line in reader:
+        if len(line) < 2 or line[1] == "":
+            break
+        data_lines.append(line)
+    return well_names, data_lines
+
+
+def _iter_data_block(reader, timepoints):
+    '''
+    Like _read_data_block, but reads a data block in pieces of at most
+    timepoints lines, so that a long block never has to be held in memory at
+    once. Must be run to the end before reading anything else from reader.
+
+    Yields: Tuples (well_names, data_lines), as returned by _read_data_block.
+    '''
+    next(reader)              # Skip a line
+    well_names = next(reader) # Chart title line
+    data_lines = []
+    for line in reader:
+        if len(line) < 2 or line[1] == "":
+            break
+        data_lines.append(line)
+        if len(data_lines) == timepoints:
+            yield well_names, data_lines
+            data_lines = []
+    if len(data_lines) > 0:
+        yield well_names, data_lines
+
+
+def _split_lines(text, final = True):
+    '''
+    Splits text from a Biotek file into lines of cells, noting where each line
+    starts and ends (as offsets into text, which are byte offsets for text
+    decoded as latin-1). Handles "\r\n", "\r" and "\n" line endings.
+
+    Arguments:
+        --text: Text to split.
+        --final: If False, a last line without a line ending is left out (it
+                    may not be completely written yet). Default True.
+    Returns: A tuple (lines, starts, ends) of lists.
+    '''
+    pieces = []
+    starts = []
+    ends   = []
+    start  = 0
+    for match in re.finditer("\r\n|\r|\n", text):
+        pieces.append(text[start:match.start()])
+        starts.append(start)
+        ends.append(match.end())
+        start = match.end()
+    if final and start < len(text):
+        pieces.append(text[start:])
+        starts.append(start)
+        ends.append(len(text))
+    return list(csv.reader(pieces)), starts, ends
+
+
+def _parse_biotek_time(raw_time):
+    '''
+    Converts a single Biotek timestamp to seconds. Handles both "H:MM:SS" and
+    Excel-style "1900" timestamps (used for runs longer than a day).
+    '''
+    time_parts = raw_time.split(':')
+    days=0
+    minutes=int(time_parts[1])
+    seconds=int(time_parts[2])
+
+    if("1900" in raw_time):
+      tstamp=pd.to_datetime(raw_time)
+      days=tstamp.day
+      hours=int(tstamp.hour)+24*days
+    else:
+      hours=int(time_parts[0])
+    return int(seconds) + 60*int(minutes) + 3600*int(hours)
+
+
+_biotek_time_pattern = r"^\s*(?:(\S*1900\S*)\s+)?(\d+):(\d+):(\d+)\s*$"
+
+def _parse_biotek_times(raw_times):
+    '''
+    Converts a block's worth of Biotek timestamps to seconds, all at once.
+    Handles the same "H:MM:SS" and Excel-style "1900-01-DD HH:MM:SS" forms as
+    _parse_biotek_time; in the latter, the date counts whole days since the
+    start of Excel's 1900 epoch. Anything else is handed to _parse_biotek_time
+    one timestamp at a time.
+
+    Returns: An integer array of times in seconds.
+    '''
+    raw_times = pd.Series(raw_times, dtype = object).astype(str)
+    parts = raw_times.str.extract(_biotek_time_pattern)
+    parsed = parts[1].notnull().to_numpy()
+    hms = parts.loc[parsed, [1, 2, 3]].astype(int).to_numpy()
+    seconds = np.zeros(len(raw_times), dtype = int)
+    seconds[parsed] = hms[:, 0] * 3600 + hms[:, 1] * 60 + hms[:, 2]
+
+    # Day rollover, from the (few distinct) dates of 1900-style timestamps.
+    dates = parts.loc[parsed, 0]
+    if dates.notnull().any():
+        unique_dates = dates.dropna().unique()
+        days = (pd.to_datetime(unique_dates) \
+                - pd.Timestamp("1899-12-31")).days
+        seconds[parsed] += 86400 * dates.map(dict(zip(unique_dates, days)))\
+                                        .fillna(0).to_numpy(dtype = int)
+
+    for i in np.flatnonzero(~parsed):
+        seconds[i] = _parse_biotek_time(raw_times.iloc[i])
+    return seconds
+
+
+def _tidy_block(properties, well_names, data_lines, supplementary_data,
+                has_supplementary, plate_reader_id, convert_to_uM,
+                calibration_dict, volume, dropped_wells = None):
+    '''
+    Converts one data block of a Biotek file into tidy columns.
+
+    The whole block is handled as a (time x well) array at once: empty cells
+    and wells without supplementary data are masked out, supplementary data
+    (a DataFrame indexed by well; see _read_supplementary_df) is joined on
+    with one index lookup per well, and unit conversion is done as a single
+    array operation.
+
+    If dropped_wells is a list, names of wells thrown out for lack of
+    supplementary data are added to it (if not there already); otherwise,
+    they're warned about.
+
+    Returns: An OrderedDict mapping each tidy column name to a numpy array of
+                values. Calling tolist() on each array gives the same Python
+                values, in the same order, that the row-by-row tidier has
+                always written.
+    '''
+    n_cols = max([len(well_names)] + [len(l) for l in data_lines])
+    well_names = np.array(list(well_names[3:]) \
+                          + [""] * (n_cols - len(well_names)), dtype = object)
+    values = np.array([l[3:] + [""] * (n_cols - len(l)) for l in data_lines],
+                      dtype = str).reshape((len(data_lines), n_cols - 3))
+    # Parse the block's times once; every well in it shares them.
+    time_secs  = _parse_biotek_times([l[1] for l in data_lines])
+    time_hours = time_secs / 3600.0
+
+    # Throw out empty cells, and wells without any supplementary information.
+    keep = np.char.strip(values) != ""
+    info_rows = supplementary_data.index.get_indexer(well_names)
+    if has_supplementary:
+        has_info = info_rows >= 0
+        missing  = [w for w in well_names[keep.any(axis = 0) & ~has_info]]
+        if dropped_wells is None:
+            _warn_dropped_wells(missing)
+        else:
+            dropped_wells.extend(w for w in missing if not w in dropped_wells)
+        keep &= has_info[np.newaxis, :]
+    time_idx, well_idx = np.nonzero(keep)
+    n_rows = len(time_idx)
+
+    measurements = None
+    if properties.reading_OD:
+        units = "absorbance"
+    else:
+        if convert_to_uM:
+            measurements = calibration_dict.to_uM(values[keep],
+                                                  properties.read_name,
+                                                  plate_reader_id,
+                                                  properties.gain, volume)
+        units = "AFU" if measurements is None else "uM"
+    if measurements is None:
+        measurements = values[keep].astype(object)
+        measurements[np.char.upper(values[keep]) == "OVRFLW"] = np.infty
+
+    def repeated(value):
+        column = np.empty(n_rows, dtype = object)
+        column.fill(value)
+        return column
+
+    kept_wells = well_names[well_idx]
+    columns = collections.OrderedDict()
+    columns['Channel']     = repeated(properties.read_name)
+    columns['Gain']        = repeated(properties.gain)
+    columns['Time (sec)']  = time_secs[time_idx]
+    columns['Time (hr)']   = time_hours[time_idx]
+    columns['Well']        = kept_wells
+    columns['Measurement'] = measurements
+    columns['Units']       = repeated(units)
+    columns['Excitation']  = repeated(str(properties.excitation))
+    columns['Emission']    = repeated(str(properties.emission))
+    kept_info_rows = info_rows[well_idx]
+    for name in supplementary_data.columns:
+        columns[name] = supplementary_data[name].to_numpy(dtype = object)\
+                                                [kept_info_rows]
+    columns['ChanStr'] = repeated(properties.read_name + str(properties.gain) \
+                                  + str(properties.excitation) \
+                                  + str(properties.emission))
+    return columns
+
+
+def _tidy_column_names(supplementary_data):
+    '''
+    Names of the columns of a tidy Biotek file, in order.
+    '''
+    title_row = ['Channel', 'Gain', 'Time (sec)', 'Time (hr)', 'Well',
+                 'Measurement', 'Units', 'Excitation', 'Emission']
+    for name in supplementary_data.columns:
+        title_row.append(name)
+    title_row.append('ChanStr')
+    return title_row
+
+
+def _prepare_tidy_inputs(supplementary_filename, volume, calibration_dict):
+    '''
+    Fills in defaults and loads everything tidy_biotek_data needs besides the
+    data file itself.
+
+    Returns: A tuple (supplementary_data, volume, calibration_dict), where
+                supplementary_data is a DataFrame indexed by well (see
+                _read_supplementary_df; empty if there's no supplementary
+                file).
+    '''
+    if volume == None:
+        print("Assuming default volume 10 uL. Make sure this is what you want!")
+        volume = 10.0
+
+    if supplementary_filename:
+        supplementary_data = _read_supplementary_df(supplementary_filename)
+    else:
+        supplementary_data = pd.DataFrame(index = pd.Index([], dtype = object))
+
+    if calibration_dict is None:
+        calibration_dict = calibration_table()
+    else:
+        calibration_dict = _as_calibration_table(calibration_dict)
+
+    return supplementary_data, volume, calibration_dict
+
+
+def _is_excel_file(input_filename):
+    '''
+    True if a file name has an Excel (.xls, .xlsx, .xlsm, ...) extension.
+    '''
+    return input_filename.rpartition(".")[2].lower().startswith("xls")
+
+
+def _excel_cell_text(value):
+    '''
+    Converts the value of a cell in an Excel Biotek export to the text the
+    same cell has in a CSV export, so both can go through the same parser.
+    Times come out as "H:MM:SS", and times of a day or more (which Excel
+    stores as dates in January 1900) as "1900-01-DD HH:MM:SS".
+    '''
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, timedelta):
+        seconds = int(round(value.total_seconds()))
+        return "%d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60,
+                                 seconds % 60)
+    if isinstance(value, clock_time):
+        seconds = int(round(value.hour * 3600 + value.minute * 60 \
+                            + value.second + value.microsecond / 1e6))
+        if seconds >= 86400:
+            return "1900-01-01 00:00:00"
+        return "%d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60,
+                                 seconds % 60)
+    if isinstance(value, datetime):
+        value = value + timedelta(microseconds = 500000)
+        return value.replace(microsecond = 0).strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _read_excel_rows(input_filename):
+    '''
+    Reads the first sheet of an Excel Biotek export one row at a time, without
+    loading the whole workbook. Each row is a list of strings, as a csv reader
+    would give for the same sheet exported as a CSV (see _excel_cell_text).
+
+    .xlsx and .xlsm files are streamed with openpyxl, in read-only mode; old
+    .xls files are read with pandas (which requires xlrd).
+    '''
+    if input_filename.rpartition(".")[2].lower() == "xls":
+        sheet = pd.read_excel(input_filename, header = None, dtype = object)
+        for row in sheet.itertuples(index = False):
+            yield [_excel_cell_text(value) for value in row]
+        return
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Reading Excel files requires openpyxl; install "
+                          "it, or export the data as a CSV.")
+    workbook = openpyxl.load_workbook(input_filename, read_only = True,
+                                      data_only = True)
+    try:
+        sheet = workbook.worksheets[0]
+        for row in sheet.iter_rows(values_only = True):
+            yield [_excel_cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def _read_biotek_rows(input_filename):
+    '''
+    Iterates over the rows of a Biotek output file (a CSV or an Excel file),
+    each as a list of strings.
+    '''
+    if _is_excel_file(input_filename):
+        for row in _read_excel_rows(input_filename):
+            yield row
+        return
+    with mt_open(input_filename, 'r') as infile:
+        for row in csv.reader(infile):
+            yield row
+
+
+def _iter_tidy_blocks(input_filename, supplementary_data, has_supplementary,
+                      volume, convert_to_uM, calibration_dict,
+                      override_plate_reader_id, timepoints = None):
+    '''
+    Reads a Biotek output file (CSV or Excel) one data block at a time,
+    yielding each block as tidy columns (see _tidy_block). If timepoints is
+    not None, blocks are read and yielded in pieces of at most that many
+    timepoints.
+    '''
+    reader = _read_biotek_rows(input_filename)
+
+    # Read plate information from the header.
+    plate_reader_id, read_sets, line = \
+        _read_biotek_header(reader, override_plate_reader_id)
+
+    # Read data blocks. Each block (or piece of a block) is read in full, then
+    # converted all at once.
+    dropped_wells = []
+    while line != None:
+        info = line[0].strip() if len(line) > 0 else ""
+        if info in ["", "Layout", "Results"]:
+            line = next(reader, None)
+            continue
+        properties = _block_properties(info, read_sets)
+        if timepoints is None:
+            pieces = [_read_data_block(reader)]
+        else:
+            pieces = _iter_data_block(reader, timepoints)
+        for well_names, data_lines in pieces:
+            if len(data_lines) > 0:
+                yield _tidy_block(properties, well_names, data_lines,
+                                  supplementary_data, has_supplementary,
+                                  plate_reader_id, convert_to_uM,
+                                  calibration_dict, volume, dropped_wells)
+        line = next(reader, None)
+    _warn_dropped_wells(dropped_wells)
+
+
+def _tidy_blocks(input_filename, supplementary_data, has_supplementary,
+                 volume, convert_to_uM, calibration_dict,
+                 override_plate_reader_id, workers = None):
+    '''
+    Iterates over a Biotek file's tidy blocks (see _tidy_block), in file order,
+    tidying them in worker processes if workers is not None (and the file is
+    a CSV; Excel files can't be split by byte offset, so are always tidied in
+    this process).
+    '''
+    if workers is None or _is_excel_file(input_filename):
+        return _iter_tidy_blocks(input_filename, supplementary_data,
+                                 has_supplementary, volume, convert_to_uM,
+                                 calibration_dict, override_plate_reader_id)
+    return _iter_parallel_tidy_blocks(input_filename, supplementary_data,
+                                      has_supplementary, volume, convert_to_uM,
+                                      calibration_dict,
+                                      override_plate_reader_id, workers)
+
+
+def _write_tidy_csv(output_filename, column_names, blocks, append = False):
+    '''
+    Writes an iterable of tidy blocks (see _tidy_block) to a tidy CSV, or
+    appends them (without a header row) to an existing one.
+    '''
+    with mt_open(output_filename, 'a' if append else 'w') as outfile:
+        writer = csv.writer(outfile, delimiter = ',')
+        if not append:
+            writer.writerow(column_names)
+        for columns in blocks:
+            writer.writerows(zip(*[c.tolist() for c in columns.values()]))
+
+
+def _maybe_numeric(column):
+    '''
+    Converts a column to a numeric type if every value in it is a number,
+    mirroring the type inference pandas.read_csv would do on a tidy CSV.
+    '''
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
+
+
+def _tidy_dataframe(column_names, blocks):
+    '''
+    Assembles a list of tidy blocks (see _tidy_block) into a single DataFrame,
+    with the same dtypes pandas.read_csv would give the equivalent tidy CSV.
+    '''
+    data = collections.OrderedDict()
+    for name in column_names:
+        if len(blocks) == 0:
+            data[name] = np.array([], dtype = object)
+        else:
+            data[name] = np.concatenate([b[name] for b in blocks])
+    df = pd.DataFrame(data, columns = column_names)
+    df["Measurement"] = df["Measurement"].astype(float)
+    for name in column_names:
+        if name not in ["Channel", "Time (sec)", "Time (hr)", "Well",
+                        "Measurement", "Units", "ChanStr"]:
+            df[name] = _maybe_numeric(df[name])
+    return df
+
+
+def tidy_biotek_data(input_filename, supplementary_filename = None,
+                     volume = None, convert_to_uM = False,
+                     calibration_dict = None, override_plate_reader_id=None,
+                     file_format = "csv", workers = None):
+    '''
+    Convert the raw output from a Biotek plate reader into tidy data.
+    Optionally, also adds columns of metadata specified by a "supplementary
+    file", which is a CSV spreadsheet mapping well numbers to metadata.
+
+    Arguments:
+        --input_filename: Name of a Biotek output file. Data file should be
+                            standard excel output files, either saved as a
+                            CSV or as the workbook itself (.xlsx/.xlsm files
+                            are read row by row with openpyxl; .xls files
+                            need xlrd).
+        --supplementary_filename: Name of a supplementary file. Supplementary
+                                    file must be a CSV wit a header, where the
+                                    first column is the name of the well,
+                                    additional columns define additional
+                                    metadata, and each row after the header is a
+                                    single well's metadata. Defaults to None
+                                    (no metadata other than what can be mined
+                                    from the data file).
+        --volume: Volume of the TX-TL reactions. Note that default is 10 uL!
+                    if you don't care about the volume set convert_to_uM to
+                    False.
+        --convert_to_uM: Flag that decides whether or not to calculate
+                            micromolar concentrations from biotek data.
+                            Default True. Note that OD data is not, by default,
+                            normalized, but other channels will be even if you
+                            are using cells, unless you set this flag to False.
+        --calibration_dict: Dictionary of calibrations you want to use to
+                                convert AFU readings to uM measurements, as
+                                returned by calibration_data (or a
+                                CalibrationTable, as returned by
+                                calibration_table). Default none, in which
+                                case the most recent calibration will be used
+                                for each channel.
+        --override_plate_reader_id: If not None, the plate reader ID will be
+                                        set to this. Default None.
+        --file_format: Format of the tidy output file. One of "csv" (default),
+                        "parquet" or "feather". Parquet and feather files are
+                        compressed and columnar, with repeated strings (channel
+                        names, units, metadata, etc.) dictionary-encoded; they
+                        require pyarrow, and can be read back quickly with
+                        read_tidy_biotek_data.
+        --workers: If not None, splits the data file at its block boundaries
+                    and tidies the blocks (one per channel/gain/read) in this
+                    many worker processes, which helps with large,
+                    many-channel files. Output is the same, in the same order.
+                    Only used for CSV data files.
+                    Default None (blocks are tidied one at a time in this
+                    process).
+    Returns: None
+    Side Effects: Creates a new file with the same name as the data file with
+                    "_tidy" appended to the end (and an extension matching
+                    file_format). This new file is in tidy format, with each
+                    row representing a single channel read from a single well
+                    at a single time.
+
+    '''
+    file_format = file_format.lower()
+    if not file_format in tidy_file_formats:
+        raise ValueError(('Unknown file format "{0}"; file_format must be ' \
+                          + '"csv", "parquet", or "feather"').format(file_format))
+    filename_base   = input_filename.rsplit('.', 1)[0]
+    output_filename = filename_base + "_tidy." + file_format
+
+    supplementary_data, volume, calibration_dict = \
+        _prepare_tidy_inputs(supplementary_filename, volume, calibration_dict)
+
+    column_names = _tidy_column_names(supplementary_data)
+    blocks = _tidy_blocks(input_filename, supplementary_data,
+                          bool(supplementary_filename), volume, convert_to_uM,
+                          calibration_dict, override_plate_reader_id, workers)
+    if file_format == "csv":
+        # Stream data directly from the data file to the tidy output file, one
+        # block at a time, without having to store much.
+        _write_tidy_csv(output_filename, column_names, blocks)
+    else:
+        df = _dictionary_encode(_tidy_dataframe(column_names, list(blocks)))
+        if file_format == "parquet":
+            df.to_parquet(output_filename, index = False)
+        else:
+            df.to_feather(output_filename)
+
+
+def _dictionary_encode(df):
+    '''
+    Converts every string column of a tidy DataFrame to a categorical column,
+    which columnar formats store dictionary-encoded. Columns that mix strings
+    and numbers (e.g. a Gain column with "AutoScale" reads) are stored as
+    strings.
+    '''
+    df = df.copy()
+    for name in df.columns:
+        if df[name].dtype == object:
+            df[name] = df[name].astype(str).astype("category")
+    return df
+
+
+def read_tidy_biotek_data(filenames, columns = None, compact = False):
+    '''
+    Reads one or more tidy Biotek files, as written by tidy_biotek_data, into a
+    single DataFrame. File format (csv, parquet or feather) is figured out from
+    each file's extension.
+
+    Params:
+        filenames: Name of a tidy file, or a list of names of tidy files.
+        columns: Optional list of columns to read. For parquet and feather
+                    files, only these columns are read from disk. Default None
+                    (all columns).
+        compact: If True, shrinks the DataFrame with compact_tidy_df. Default
+                    False.
+    Returns: A DataFrame of tidy data, with the rows from each file in order.
+                String columns from parquet/feather files are categorical.
+    '''
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    dfs = []
+    for filename in filenames:
+        file_format = filename.rpartition(".")[2].lower()
+        if file_format == "parquet":
+            dfs.append(pd.read_parquet(filename, columns = columns))
+        elif file_format == "feather":
+            dfs.append(pd.read_feather(filename, columns = columns))
+        else:
+            dfs.append(pd.read_csv(filename, usecols = columns))
+    if len(dfs) == 1:
+        df = dfs[0]
+    else:
+        df = pd.concat(dfs, ignore_index = True)
+        # Concatenating categoricals with different categories falls back to
+        # plain strings; re-encode them.
+        for name in df.columns:
+            if all(d[name].dtype.name == "category" for d in dfs):
+                df[name] = df[name].astype("category")
+    if compact:
+        df = compact_tidy_df(df)
+    return df
+
+
+def compact_tidy_df(df, measurement_dtype = np.float64, report = False):
+    '''
+    Shrinks the memory footprint of a tidy DataFrame:
+        * String columns (Channel, Well, Units, ChanStr and any string
+            metadata) become categorical.
+        * Measurement becomes a float column of type measurement_dtype.
+            "OVRFLW" readings become inf; anything else that isn't a number
+            becomes NaN.
+        * Time (sec), Gain, Excitation and Emission become the smallest
+            integer type that holds them (if they hold only integers).
+    Other numeric columns (Time (hr), numeric metadata) are left alone.
+
+    Params:
+        df: DataFrame of tidy data, of the form produced by tidy_biotek_df.
+        measurement_dtype: Float type for Measurement. Default np.float64;
+                            np.float32 halves the space used by measurements,
+                            at the cost of precision.
+        report: If True, prints memory usage before and after. Default False.
+    Returns: A compacted copy of df.
+    '''
+    before = df.memory_usage(deep = True).sum()
+    df = df.copy()
+    for name in df.columns:
+        column = df[name]
+        if name == "Measurement":
+            if not np.issubdtype(column.dtype, np.number):
+                overflow = column.astype(str).str.upper() == "OVRFLW"
+                column = pd.to_numeric(column.mask(overflow, np.inf),
+                                       errors = "coerce")
+            df[name] = column.astype(measurement_dtype)
+        elif name in ["Time (sec)", "Gain", "Excitation", "Emission"] and \
+             np.issubdtype(column.dtype, np.integer):
+            df[name] = pd.to_numeric(column, downcast = "integer")
+        elif column.dtype == object:
+            df[name] = column.astype("category")
+    if report:
+        after = df.memory_usage(deep = True).sum()
+        print("Tidy data memory usage: %.2f MB -> %.2f MB" \
+              % (before / 1e6, after / 1e6))
+    return df
+
+
+default_tidy_cache_dir = os.path.join(os.path.expanduser("~"), ".cache",
+                                      "murraylab_tools", "tidy")
+
+# Bump this whenever a change to the tidier changes its output, so that stale
+# cached results are never returned.
+_TIDY_CACHE_VERSION = 1
+
+def _hash_file(filename, hasher = None):
+    '''
+    Feeds the bytes of a file to a hashlib hasher (a new sha256 hasher by
+    default), returning the hasher.
+    '''
+    if hasher is None:
+        hasher = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+class TidyCache(object):
+    '''
+    An on-disk cache of tidy DataFrames, keyed by the contents of the raw
+    data file and supplementary file, the calibration data, and the tidying
+    options. Re-tidying a file that hasn't changed, with the same options,
+    loads the stored frame instead of parsing anything.
+
+    Entries are pickled DataFrames, which load back exactly as they were
+    stored. When the cache grows past max_bytes, the least recently used
+    entries are deleted.
+
+    Pass a TidyCache (or True, for one in default_tidy_cache_dir) as the cache
+    argument of tidy_biotek_df or tidy_many to use it.
+    '''
+
+    def __init__(self, directory = None, max_bytes = 2 * 1024**3):
+        '''
+        Params:
+            directory: Directory to store cached data in. Created if it doesn't
+                        exist. Default None, in which case
+                        default_tidy_cache_dir (~/.cache/murraylab_tools/tidy)
+                        is used.
+            max_bytes: Maximum total size of cached data, in bytes. Default
+                        2 GB.
+        '''
+        if directory is None:
+            directory = default_tidy_cache_dir
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, input_filename, supplementary_filename = None,
+            volume = 10.0, convert_to_uM = False, calibration_dict = None,
+            override_plate_reader_id = None):
+        '''
+        Computes the cache key for tidying a file with the given options (see
+        tidy_biotek_data). The key starts with a hash of the raw data file
+        alone, so that entries for a file can be found by invalidate.
+        '''
+        raw_hash = _hash_file(input_filename).hexdigest()
+        hasher = hashlib.sha256()
+        hasher.update(raw_hash.encode())
+        if supplementary_filename:
+            hasher.update(b"supplementary")
+            _hash_file(supplementary_filename, hasher)
+        if calibration_dict is None:
+            calibration_dict = calibration_table()
+        hasher.update(_as_calibration_table(calibration_dict).version.encode())
+        hasher.update(repr((_TIDY_CACHE_VERSION, float(volume),
+                            bool(convert_to_uM),
+                            override_plate_reader_id)).encode())
+        return raw_hash[:16] + "_" + hasher.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def _entries(self):
+        '''
+        Returns a list of (filename, size, last use time) for every entry.
+        '''
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((filename, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        '''
+        Returns the DataFrame cached under key, or None if there isn't one.
+        '''
+        filename = self._filename(key)
+        try:
+            df = pd.read_pickle(filename)
+        except OSError:
+            return None
+        except (EOFError, pickle.UnpicklingError, ValueError, AttributeError,
+                ImportError, IndexError):
+            # A truncated or corrupt entry is a miss; drop it so it gets
+            # rewritten.
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+        try:
+            # Mark the entry as recently used.
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return df
+
+    def put(self, key, df):
+        '''
+        Stores a DataFrame under key, then evicts least recently used entries
+        until the cache fits in max_bytes (the new entry is always kept).
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        filename = self._filename(key)
+        # Write to a temporary file and rename it into place, so that other
+        # processes never see a partly-written entry.
+        temp_filename = "%s.%d.tmp" % (filename, os.getpid())
+        df.to_pickle(temp_filename)
+        os.replace(temp_filename, filename)
+        self.evict(keep = filename)
+
+    def evict(self, keep = None):
+        '''
+        Deletes least recently used entries until the cache fits in max_bytes.
+        '''
+        entries = sorted(self._entries(), key = lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for filename, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            total -= size
+
+    def invalidate(self, input_filename = None):
+        '''
+        Deletes cached data.
+
+        Params:
+            input_filename: If given, only deletes entries for this raw data
+                                file (with any options), as it currently
+                                reads. Default None, which empties the cache.
+        Returns: The number of entries deleted.
+        '''
+        prefix = ""
+        if input_filename is not None:
+            prefix = _hash_file(input_filename).hexdigest()[:16] + "_"
+        n_deleted = 0
+        for filename, _, _ in self._entries():
+            if os.path.basename(filename).startswith(prefix):
+                try:
+                    os.remove(filename)
+                    n_deleted += 1
+                except OSError:
+                    pass
+        return n_deleted
+
+
+def _as_tidy_cache(cache):
+    '''
+    Converts the cache argument of tidy_biotek_df to a TidyCache (or None).
+    '''
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return TidyCache()
+    return cache
+
+
+def tidy_biotek_df(input_filename, supplementary_filename = None,
+                   volume = None, convert_to_uM = False,
+                   calibration_dict = None, override_plate_reader_id = None,
+                   save_csv = False, compact = False, workers = None,
+                   cache = None):
+    '''
+    Convert the raw output from a Biotek plate reader into a tidy DataFrame,
+    without a round trip through a tidy CSV. Takes the same arguments as
+    tidy_biotek_data, and returns the same data that reading the output of
+    tidy_biotek_data with pandas.read_csv would give.
+
+    Arguments:
+        --input_filename: Name of a Biotek output file. See tidy_biotek_data.
+        --supplementary_filename: Name of a supplementary file. See
+                                    tidy_biotek_data.
+        --volume: Volume of the TX-TL reactions. See tidy_biotek_data.
+        --convert_to_uM: Flag that decides whether or not to calculate
+                            micromolar concentrations from biotek data. See
+                            tidy_biotek_data.
+        --calibration_dict: Dictionary of calibrations. See tidy_biotek_data.
+        --override_plate_reader_id: If not None, the plate reader ID will be
+                                        set to this. Default None.
+        --save_csv: If True, also writes the usual "_tidy" CSV next to the data
+                        file. Default False (nothing is written to disk).
+        --compact: If True, shrinks the DataFrame with compact_tidy_df
+                    (categorical labels, integer times, etc.). Default False.
+        --workers: Number of worker processes to tidy the file's blocks in. See
+                    tidy_biotek_data. Default None.
+        --cache: A TidyCache to look the result up in (and store it in, if it
+                    isn't there), or True to use a TidyCache in the default
+                    location. Default None (no caching). Cached results are
+                    keyed by file contents and options, so a changed file or
+                    option is always re-tidied. Warnings raised while tidying
+                    aren't repeated when a result comes from the cache, and
+                    save_csv always re-tidies the file.
+    Returns: A DataFrame of tidy data, with each row representing a single
+                channel read from a single well at a single time. Measurement
+                is a float column (overflowed reads are inf); Time (sec), Gain,
+                Excitation, Emission and numeric metadata columns are numeric.
+    '''
+    filename_base   = input_filename.rsplit('.', 1)[0]
+    output_filename = filename_base + "_tidy.csv"
+
+    supplementary_data, volume, calibration_dict = \
+        _prepare_tidy_inputs(supplementary_filename, volume, calibration_dict)
+
+    cache = _as_tidy_cache(cache)
+    df = None
+    if cache is not None:
+        key = cache.key(input_filename, supplementary_filename, volume,
+                        convert_to_uM, calibration_dict,
+                        override_plate_reader_id)
+        if not save_csv:
+            df = cache.get(key)
+    if df is None:
+        df = _tidy_biotek_df(input_filename, supplementary_filename,
+                             supplementary_data, volume, convert_to_uM,
+                             calibration_dict, override_plate_reader_id,
+                             save_csv, output_filename, workers)
+        if cache is not None:
+            cache.put(key, df)
+    if compact:
+        df = compact_tidy_df(df)
+    return df
+
+
+def _tidy_biotek_df(input_filename, supplementary_filename, supplementary_data,
+                    volume, convert_to_uM, calibration_dict,
+                    override_plate_reader_id, save_csv, output_filename,
+                    workers):
+    '''
+    Does the work of tidy_biotek_df (after defaults are filled in), without
+    caching or compacting.
+    '''
+    column_names = _tidy_column_names(supplementary_data)
+    blocks = list(_tidy_blocks(input_filename, supplementary_data,
+                               bool(supplementary_filename), volume,
+                               convert_to_uM, calibration_dict,
+                               override_plate_reader_id, workers))
+    if save_csv:
+        _write_tidy_csv(output_filename, column_names, blocks)
+    return _tidy_dataframe(column_names, blocks)
+
+
+def iter_biotek_blocks(input_filename, supplementary_filename = None,
+                       volume = None, convert_to_uM = False,
+                       calibration_dict = None, override_plate_reader_id = None,
+                       timepoints = None, dense = False):
+    '''
+    Reads a Biotek output file one data block (one read of one channel) at a
+    time, yielding tidy data for each block as it's read. Only one block (or
+    piece of a block) is held in memory at once, so this works on files too
+    big to tidy in one go, and results can be aggregated as they come, e.g.
+    a running maximum:
+
+        peak = dict()
+        for df in iter_biotek_blocks("huge_run.csv", timepoints = 100):
+            maxima = df.groupby(["ChanStr", "Well"]).Measurement.max()
+            for key, value in maxima.items():
+                peak[key] = max(value, peak.get(key, -np.inf))
+
+    Concatenating everything yielded gives the same rows, in the same order,
+    as tidy_biotek_df.
+
+    Arguments:
+        --input_filename, supplementary_filename, volume, convert_to_uM,
+          calibration_dict, override_plate_reader_id: See tidy_biotek_data.
+        --timepoints: If not None, blocks are read and yielded in pieces of at
+                        most this many timepoints, so memory use is bounded
+                        even for very long runs. Default None (whole blocks).
+        --dense: If True, yields each block as a PlateCube (one channel by
+                    wells by timepoints) instead of a tidy DataFrame. Default
+                    False.
+    Yields: A DataFrame of tidy data (see tidy_biotek_df) for each block or
+                piece of a block, or a PlateCube if dense is True.
+    '''
+    supplementary_data, volume, calibration_dict = \
+        _prepare_tidy_inputs(supplementary_filename, volume, calibration_dict)
+    column_names = _tidy_column_names(supplementary_data)
+    for block in _iter_tidy_blocks(input_filename, supplementary_data,
+                                   bool(supplementary_filename), volume,
+                                   convert_to_uM, calibration_dict,
+                                   override_plate_reader_id, timepoints):
+        df = _tidy_dataframe(column_names, [block])
+        # Pieces with no readings (e.g., past the end of an aborted run) are
+        # skipped.
+        if len(df) == 0:
+            continue
+        yield PlateCube.from_tidy(df) if dense else df
+
+
+def _tidy_one(input_filename, supplementary_filename, kwargs):
+    '''
+    Worker for tidy_many: tidies a single file, returning either
+    (input_filename, DataFrame, None) or (input_filename, None, exception).
+    '''
+    try:
+        df = tidy_biotek_df(input_filename, supplementary_filename, **kwargs)
+    except Exception as e:
+        return input_filename, None, e
+    return input_filename, df, None
+
+
+def tidy_many(input_filenames, supplementary = None, workers = None,
+              volume = None, convert_to_uM = False, calibration_dict = None,
+              override_plate_reader_id = None, concatenate = True,
+              id_column = "Plate", errors = "warn", compact = False,
+              cache = None):
+    '''
+    Tidies many Biotek output files at once, in parallel, into DataFrames (see
+    tidy_biotek_df). Each file is tidied in its own worker process.
+
+    Params:
+        input_filenames: List of names of Biotek output files.
+        supplementary: Supplementary file(s) for the data files. Either None
+                        (default; no supplementary data), the name of a single
+                        supplementary file used for every data file, a list of
+                        supplementary file names (or Nones) matching
+                        input_filenames, or a dictionary mapping data file
+                        names to supplementary file names.
+        workers: Number of worker processes. Default None, in which case one
+                    process per CPU is used. If 1, files are tidied one at a
+                    time in this process.
+        volume, convert_to_uM, override_plate_reader_id: See
+                                                         tidy_biotek_data.
+        calibration_dict: Calibration data to use for every file, as returned
+                            by calibration_data. Default None, in which case
+                            the most recent calibration is loaded once and
+                            shared by all files.
+        concatenate: If True (default), returns a single DataFrame with data
+                        from all files. If False, returns a dictionary mapping
+                        each file name to its own DataFrame.
+        id_column: Name of a column added to each file's data identifying the
+                    plate it came from (the file's name, without directory or
+                    extension). Set to None to skip. Default "Plate".
+        errors: What to do if a file can't be tidied. If "warn" (default),
+                    issues a warning naming the file and the problem, and
+                    leaves that file out of the results. If "raise", raises the
+                    first error encountered.
+        compact: If True, shrinks the results with compact_tidy_df (after
+                    concatenation, so categories are shared across plates).
+                    Default False.
+        cache: A TidyCache (or True, for the default one) to reuse results
+                from; see tidy_biotek_df. Default None.
+    Returns: A DataFrame of tidy data from all files, in the order the files
+                were given, or a dictionary of DataFrames if concatenate is
+                False.
+    '''
+    if not errors in ["warn", "raise"]:
+        raise ValueError(('Unknown error handling "{0}"; errors must be ' \
+                          + '"warn" or "raise"').format(errors))
+    if supplementary is None or isinstance(supplementary, str):
+        supplementary_filenames = [supplementary] * len(input_filenames)
+    elif isinstance(supplementary, dict):
+        supplementary_filenames = [supplementary.get(f) \
+                                   for f in input_filenames]
+    else:
+        supplementary_filenames = list(supplementary)
+        if len(supplementary_filenames) != len(input_filenames):
+            raise ValueError("Got %d supplementary files for %d data files." \
+                             % (len(supplementary_filenames),
+                                len(input_filenames)))
+
+    # Do the one-time setup here, rather than once per file.
+    if volume == None:
+        print("Assuming default volume 10 uL. Make sure this is what you want!")
+        volume = 10.0
+    if calibration_dict is None:
+        calibration_dict = calibration_table()
+    else:
+        calibration_dict = _as_calibration_table(calibration_dict)
+    kwargs = dict(volume = volume, convert_to_uM = convert_to_uM,
+                  calibration_dict = calibration_dict,
+                  override_plate_reader_id = override_plate_reader_id,
+                  cache = _as_tidy_cache(cache))
+
+    if workers == 1:
+        results = [_tidy_one(f, s, kwargs) \
+                   for f, s in zip(input_filenames, supplementary_filenames)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_tidy_one, f, s, kwargs) \
+                       for f, s in zip(input_filenames,
+                                       supplementary_filenames)]
+            results = [future.result() for future in futures]
+
+    tidy_dfs = []
+    for input_filename, df, error in results:
+        if error is not None:
+            if errors == "raise":
+                raise error
+            warnings.warn("Unable to tidy file %s (%s: %s); leaving it out." \
+                          % (input_filename, type(error).__name__, error))
+            continue
+        if id_column:
+            df[id_column] = os.path.basename(input_filename).rsplit('.', 1)[0]
+        tidy_dfs.append((input_filename, df))
+
+    if not concatenate:
+        if compact:
+            tidy_dfs = [(f, compact_tidy_df(df)) for f, df in tidy_dfs]
+        return collections.OrderedDict(tidy_dfs)
+    if len(tidy_dfs) == 0:
+        return pd.DataFrame()
+    df = pd.concat([df for _, df in tidy_dfs], ignore_index = True)
+    if compact:
+        df = compact_tidy_df(df)
+    return df
+
+
+def _block_index_filename(input_filename):
+    '''
+    Name of the file a Biotek file's block index is cached in.
+    '''
+    return input_filename.rsplit('.', 1)[0] + "_blocks.json"
+
+
+def _scan_biotek_blocks(input_filename):
+    '''
+    Scans a Biotek CSV for its data blocks, without tidying any data.
+
+    Returns: A dictionary with the plate reader ID and a list of blocks, each
+                a dictionary with the block's properties (see
+                BlockProperties), its well names, its number of timepoints, and
+                the byte offsets of its first data line ("Start") and of the
+                end of its last data line ("End").
+    '''
+    with open(input_filename, 'rb') as infile:
+        text = infile.read().decode("latin-1")
+    lines, starts, ends = _split_lines(text)
+    header = _read_header_lines(lines)
+    blocks = []
+    plate_reader_id = None
+    if header is not None:
+        plate_reader_id, read_sets, i = header
+        # Walk the blocks the same way _iter_tidy_blocks does.
+        while i < len(lines):
+            line = lines[i]
+            info = line[0].strip() if len(line) > 0 else ""
+            if info in ["", "Layout", "Results"]:
+                i += 1
+                continue
+            properties = _block_properties(info, read_sets)
+            first = i + 3
+            last  = first
+            while last < len(lines) and len(lines[last]) >= 2 \
+                  and lines[last][1] != "":
+                last += 1
+            if last > first:
+                block = properties._asdict()
+                block.update(WellNames = lines[i + 2] if i + 2 < len(lines) \
+                                         else [],
+                             Timepoints = last - first,
+                             Start = starts[first], End = ends[last - 1])
+                blocks.append(block)
+            i = last + 1
+    return dict(plate_reader_id = plate_reader_id, blocks = blocks)
+
+
+def _biotek_block_index(input_filename, rebuild = False, cache = True):
+    '''
+    Loads the block index of a Biotek CSV (see _scan_biotek_blocks) from its
+    cache file, scanning the file if there's no cache, the cache is out of
+    date, or rebuild is True. A freshly scanned index is written to the cache
+    file unless cache is False.
+    '''
+    if _is_excel_file(input_filename):
+        raise ValueError("Can't index Excel file %s; export it as a CSV." \
+                         % input_filename)
+    stat = os.stat(input_filename)
+    index_filename = _block_index_filename(input_filename)
+    if not rebuild and os.path.exists(index_filename):
+        try:
+            with open(index_filename, 'r') as index_file:
+                index = json.load(index_file)
+            if index.get("size") == stat.st_size and \
+               index.get("mtime_ns") == stat.st_mtime_ns:
+                return index
+        except (ValueError, OSError):
+            pass
+    index = _scan_biotek_blocks(input_filename)
+    index.update(size = stat.st_size, mtime_ns = stat.st_mtime_ns)
+    if not cache:
+        return index
+    try:
+        with open(index_filename, 'w') as index_file:
+            json.dump(index, index_file)
+    except OSError as e:
+        warnings.warn("Couldn't cache block index for %s: %s" \
+                      % (input_filename, e))
+    return index
+
+
+def index_biotek_file(input_filename, rebuild = False):
+    '''
+    Lists the data blocks in a Biotek CSV: which channel and gain each holds,
+    how many timepoints it has, and where it is in the file. The list is
+    cached next to the file (as "<file name>_blocks.json") and reused until the
+    file changes.
+
+    Arguments:
+        --input_filename: Name of a Biotek output CSV.
+        --rebuild: If True, rescans the file even if there's an up-to-date
+                    cached index. Default False.
+    Returns: A DataFrame with one row per data block, with columns Channel,
+                Gain, Excitation, Emission, Timepoints, Wells (the number of
+                wells in the block) and Start/End (byte offsets of the block's
+                data).
+    '''
+    index = _biotek_block_index(input_filename, rebuild)
+    return pd.DataFrame([dict(Channel = b["read_name"], Gain = b["gain"],
+                              Excitation = b["excitation"],
+                              Emission = b["emission"],
+                              Timepoints = b["Timepoints"],
+                              Wells = len(b["WellNames"]) - 3,
+                              Start = b["Start"], End = b["End"]) \
+                         for b in index["blocks"]],
+                        columns = ["Channel", "Gain", "Excitation", "Emission",
+                                   "Timepoints", "Wells", "Start", "End"])
+
+
+def read_channel(input_filename, channel, gain = None,
+                 supplementary_filename = None, volume = None,
+                 convert_to_uM = False, calibration_dict = None,
+                 override_plate_reader_id = None):
+    '''
+    Reads tidy data for a single channel out of a Biotek CSV, parsing only the
+    block(s) holding that channel. Uses the file's block index (see
+    index_biotek_file), building it first if need be.
+
+    Arguments:
+        --input_filename: Name of a Biotek output CSV.
+        --channel: Name of the channel (read) to get, e.g. "OD600" or "GFP".
+        --gain: Gain of the channel to get. May be left as None if the channel
+                    was only read at one gain.
+        --supplementary_filename, volume, convert_to_uM, calibration_dict,
+          override_plate_reader_id: See tidy_biotek_data.
+    Returns: A DataFrame of tidy data for that channel, the same as the
+                matching rows of tidy_biotek_df's output.
+    '''
+    index  = _biotek_block_index(input_filename)
+    blocks = [b for b in index["blocks"] if b["read_name"] == channel]
+    if gain is not None:
+        blocks = [b for b in blocks if b["gain"] == gain]
+    if len(blocks) == 0:
+        raise ValueError("No data for channel '%s' with gain %s in %s." \
+                         % (channel, gain, input_filename))
+    if len(set(b["gain"] for b in blocks)) > 1:
+        raise ValueError(("Channel '%s' is read at more than one gain; " \
+                          + "specify a gain.") % channel)
+
+    supplementary_data, volume, calibration_dict = \
+        _prepare_tidy_inputs(supplementary_filename, volume, calibration_dict)
+    plate_reader_id = _indexed_plate_reader_id(index,
+                                               override_plate_reader_id)
+    tidy_blocks = _tidy_indexed_blocks(input_filename, blocks,
+                                       supplementary_data,
+                                       bool(supplementary_filename),
+                                       plate_reader_id, convert_to_uM,
+                                       calibration_dict, volume)
+    return _tidy_dataframe(_tidy_column_names(supplementary_data),
+                           tidy_blocks)
+
+
+def _indexed_plate_reader_id(index, override_plate_reader_id = None):
+    '''
+    Plate reader ID to use for a file with the given block index.
+    '''
+    if override_plate_reader_id != None:
+        warnings.warn(("Plate reader id overridden to be '%s'") \
+                      % override_plate_reader_id)
+        return override_plate_reader_id
+    return index["plate_reader_id"]
+
+
+def _tidy_indexed_blocks(input_filename, blocks, supplementary_data,
+                         has_supplementary, plate_reader_id, convert_to_uM,
+                         calibration_dict, volume, dropped_wells = None):
+    '''
+    Reads and tidies some of the data blocks in a Biotek CSV, given their
+    entries in the file's block index (see _scan_biotek_blocks). Only the
+    bytes of those blocks are read. Wells without supplementary data are
+    added to dropped_wells, or warned about once if it's None.
+
+    Returns: A list of tidy blocks (see _tidy_block), in the order given.
+    '''
+    warn = dropped_wells is None
+    if warn:
+        dropped_wells = []
+    tidy_blocks = []
+    with open(input_filename, 'rb') as infile:
+        for block in blocks:
+            infile.seek(block["Start"])
+            text = infile.read(block["End"] - block["Start"]).decode("latin-1")
+            properties = BlockProperties(block["read_name"],
+                                         block["reading_OD"],
+                                         block["excitation"],
+                                         block["emission"], block["gain"])
+            tidy_blocks.append(_tidy_block(properties, block["WellNames"],
+                                           _split_lines(text)[0],
+                                           supplementary_data,
+                                           has_supplementary, plate_reader_id,
+                                           convert_to_uM, calibration_dict,
+                                           volume, dropped_wells))
+    if warn:
+        _warn_dropped_wells(dropped_wells)
+    return tidy_blocks
+
+
+def _tidy_indexed_blocks_job(*args):
+    '''
+    Worker for _iter_parallel_tidy_blocks: runs _tidy_indexed_blocks, returning
+    its tidy blocks, a list of (message, category) pairs for any warnings it
+    raised, and a list of wells dropped for lack of supplementary data.
+    '''
+    dropped_wells = []
+    with warnings.catch_warnings(record = True) as caught:
+        warnings.simplefilter("always")
+        tidy_blocks = _tidy_indexed_blocks(*args,
+                                           dropped_wells = dropped_wells)
+    return tidy_blocks, [(str(w.message), w.category) for w in caught], \
+           dropped_wells
+
+
+def _iter_parallel_tidy_blocks(input_filename, supplementary_data,
+                               has_supplementary, volume, convert_to_uM,
+                               calibration_dict, override_plate_reader_id,
+                               workers):
+    '''
+    Parallel version of _iter_tidy_blocks: splits a Biotek CSV at its block
+    boundaries (using an up-to-date cached block index if there is one, but
+    not writing one) and tidies each block in a pool of worker processes.
+    Yields tidy blocks in file order.
+    '''
+    index = _biotek_block_index(input_filename, cache = False)
+    plate_reader_id = _indexed_plate_reader_id(index,
+                                               override_plate_reader_id)
+    blocks = index["blocks"]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_tidy_indexed_blocks_job, input_filename,
+                                   [block], supplementary_data,
+                                   has_supplementary, plate_reader_id,
+                                   convert_to_uM, calibration_dict, volume) \
+                   for block in blocks]
+        dropped_wells = []
+        for future in futures:
+            tidy_blocks, caught, dropped = future.result()
+            # Re-issue warnings from the workers here, where they can be seen
+            # (and caught).
+            for message, category in caught:
+                warnings.warn(message, category)
+            dropped_wells.extend(w for w in dropped if not w in dropped_wells)
+            for tidy_block in tidy_blocks:
+                yield tidy_block
+        _warn_dropped_wells(dropped_wells)
+
+
+class BiotekTailer(object):
+    '''
+    Incrementally tidies a Biotek export that is still being written (e.g.,
+    during a long kinetic run). Each call to update reads only the part of the
+    file written since the last call, picking up parsing where it left off,
+    and returns the new tidy rows.
+
+    The tailer remembers the byte offset it has read up to, the plate
+    information from the header, and where it was in the data (which block,
+    that block's well header, and so on). Only complete lines are read; a
+    partly written last line is left for the next update. If the file shrinks
+    or its beginning changes (i.e., it was rewritten rather than appended to),
+    the tailer starts over from the beginning of the file.
+
+    Attributes:
+        input_filename -- Name of the Biotek CSV being followed.
+        output_filename -- Name of a tidy CSV that new rows are appended to,
+                            or None.
+        offset -- Number of bytes of the input file read so far.
+        df -- All tidy data read so far, as a DataFrame.
+    '''
+
+    def __init__(self, input_filename, supplementary_filename = None,
+                 volume = None, convert_to_uM = False, calibration_dict = None,
+                 override_plate_reader_id = None, output_filename = None):
+        '''
+        Params:
+            input_filename -- Name of a Biotek output CSV (Excel files can't be
+                                followed).
+            supplementary_filename, volume, convert_to_uM, calibration_dict,
+            override_plate_reader_id -- See tidy_biotek_data.
+            output_filename -- If not None, every update also appends its new
+                                rows to a tidy CSV with this name (which is
+                                overwritten when the tailer starts).
+        '''
+        if _is_excel_file(input_filename):
+            raise ValueError("Can't follow Excel file %s; export it as a CSV." \
+                             % input_filename)
+        self.input_filename  = input_filename
+        self.output_filename = output_filename
+        self.convert_to_uM   = convert_to_uM
+        self.override_plate_reader_id = override_plate_reader_id
+        self.has_supplementary = bool(supplementary_filename)
+        self.supplementary_data, self.volume, self.calibration_dict = \
+            _prepare_tidy_inputs(supplementary_filename, volume,
+                                 calibration_dict)
+        self.column_names = _tidy_column_names(self.supplementary_data)
+        self._reset()
+
+    def _reset(self):
+        self.offset           = 0
+        self._prefix          = b""
+        self._skip_newline    = False
+        self._stage           = "header"
+        self._plate_reader_id = None
+        self._read_sets       = None
+        self._properties      = None
+        self._well_names      = None
+        self._frames          = []
+        self._df              = None
+        self._dropped_wells   = []
+        if self.output_filename:
+            _write_tidy_csv(self.output_filename, self.column_names, [])
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = pd.concat(self._frames, ignore_index = True) \
+                       if self._frames \
+                       else pd.DataFrame(columns = self.column_names)
+            self._frames = [self._df]
+        return self._df
+
+    def _new_lines(self, final):
+        '''
+        Reads complete lines written since the last update. Returns a list of
+        (line, end offset) pairs, with each line split into cells.
+        '''
+        with open(self.input_filename, 'rb') as infile:
+            size = infile.seek(0, os.SEEK_END)
+            infile.seek(0)
+            prefix = infile.read(min(len(self._prefix), size))
+            if size < self.offset or prefix != self._prefix:
+                warnings.warn("%s was rewritten; re-reading it from the start." \
+                              % self.input_filename)
+                self._reset()
+            infile.seek(self.offset)
+            text = infile.read().decode("latin-1")
+
+        # The last update may have stopped between the two halves of a "\r\n"
+        # line ending.
+        if self._skip_newline and text.startswith("\n"):
+            text = text[1:]
+            self.offset += 1
+        if text:
+            self._skip_newline = False
+
+        # Bytes and latin-1 characters match one to one, so character
+        # positions are byte offsets.
+        lines, _, ends = _split_lines(text, final)
+        if ends and text[:ends[-1]].endswith("\r"):
+            self._skip_newline = True
+        return [(line, self.offset + end) for line, end in zip(lines, ends)]
+
+    def _read_header(self, lines, final):
+        '''
+        Tries to parse the file header from the start of lines. Returns the
+        number of lines it used, or None if the header isn't finished yet.
+        '''
+        header = _read_header_lines([line for line, _ in lines],
+                                    self.override_plate_reader_id, final)
+        if header is None:
+            return None
+        self._plate_reader_id, self._read_sets, n_header = header
+        self._stage = "between"
+        return n_header
+
+    def _feed(self, line, batches):
+        '''
+        Advances the parse by one line, adding new data lines to batches, a
+        list of [properties, well_names, data_lines] for each block seen.
+        Mirrors the block reading in _iter_tidy_blocks and _read_data_block.
+        '''
+        if self._stage == "between":
+            info = line[0].strip() if len(line) > 0 else ""
+            if info in ["", "Layout", "Results"]:
+                return
+            self._properties = _block_properties(info, self._read_sets)
+            self._stage = "skip"
+        elif self._stage == "skip":
+            self._stage = "wells"
+        elif self._stage == "wells":
+            self._well_names = line
+            self._stage = "rows"
+        elif len(line) < 2 or line[1] == "":
+            self._stage = "between"
+        else:
+            if not batches or batches[-1][0] is not self._properties:
+                batches.append([self._properties, self._well_names, []])
+            batches[-1][2].append(line)
 
-ReadSet = collections.namedtuple('ReadSet', ['name', 'excitation', 'emission',
-                                             'gain'])
+    def update(self, final = False):
+        '''
+        Reads everything written to the file since the last update.
 
-def read_supplementary_info(input_filename):
-    info = dict()
-    with mt_open(input_filename, 'rU') as infile:
-        reader = csv.reader(infile)
-        title_line = next(reader)
-        title_line = list(map(lambda s:s.strip(), title_line))
-        for i in range(1, len(title_line)):
-            info[title_line[i]] = dict()
-        for line in reader:
-            line = list(map(lambda s:s.strip(), line))
-            if line[0].strip() == "":
-                continue
-            for i in range(1, len(title_line)):
-                info[title_line[i]][line[0]] = line[i]
-    return info
+        Params:
+            final -- If True, a last line without a line ending is read too.
+                        Use once the export is finished. Default False.
+        Returns: A DataFrame of the new tidy rows (possibly empty).
+        '''
+        if self._stage == "header":
+            # Re-read the header from the start until it's complete.
+            self.offset = 0
+            self._skip_newline = False
+        lines = self._new_lines(final)
+        if self._stage == "header":
+            n_header = self._read_header(lines, final)
+            if n_header is None:
+                return pd.DataFrame(columns = self.column_names)
+            with open(self.input_filename, 'rb') as infile:
+                self._prefix = infile.read(min(lines[-1][1], 1024))
+            lines = lines[n_header:]
+
+        batches = []
+        for line, end in lines:
+            self._feed(line, batches)
+            self.offset = end
+
+        # Only warn about each well without supplementary data once.
+        dropped_wells = list(self._dropped_wells)
+        blocks = [_tidy_block(properties, well_names, data_lines,
+                              self.supplementary_data, self.has_supplementary,
+                              self._plate_reader_id, self.convert_to_uM,
+                              self.calibration_dict, self.volume,
+                              dropped_wells) \
+                  for properties, well_names, data_lines in batches]
+        _warn_dropped_wells(dropped_wells[len(self._dropped_wells):])
+        self._dropped_wells = dropped_wells
+        if self.output_filename:
+            _write_tidy_csv(self.output_filename, self.column_names, blocks,
+                            append = True)
+        new_df = _tidy_dataframe(self.column_names, blocks)
+        if len(new_df) > 0:
+            self._frames.append(new_df)
+            self._df = None
+        return new_df
+
+
+def _sql_name(name):
+    '''
+    Quotes a column name for use in SQL.
+    '''
+    return '"' + str(name).replace('"', '""') + '"'
 
 
-def tidy_biotek_data(input_filename, supplementary_filename = None,
-                     volume = None, convert_to_uM = False,
-                     calibration_dict = None, override_plate_reader_id=None):
+def _sql_values(column):
     '''
-    Convert the raw output from a Biotek plate reader into tidy data.
-    Optionally, also adds columns of metadata specified by a "supplementary
-    file", which is a CSV spreadsheet mapping well numbers to metadata.
+    Converts a DataFrame column to a list of values SQLite can store (plain
+    Python numbers and strings, with None for missing values).
+    '''
+    if column.dtype.name == "category":
+        column = column.astype(object)
+    if column.dtype != object:
+        return [None if v != v else v for v in column.tolist()]
+    return [None if (v is None or v != v) else \
+            (v.item() if isinstance(v, np.generic) else v) for v in column]
 
-    Arguments:
-        --input_filename: Name of a Biotek output file. Data file should be
-                            standard excel output files, saved as a CSV.
-        --supplementary_filename: Name of a supplementary file. Supplementary
-                                    file must be a CSV wit a header, where the
-                                    first column is the name of the well,
-                                    additional columns define additional
-                                    metadata, and each row after the header is a
-                                    single well's metadata. Defaults to None
-                                    (no metadata other than what can be mined
-                                    from the data file).
-        --volume: Volume of the TX-TL reactions. Note that default is 10 uL!
-                    if you don't care about the volume set convert_to_uM to
-                    False.
-        --convert_to_uM: Flag that decides whether or not to calculate
-                            micromolar concentrations from biotek data.
-                            Default True. Note that OD data is not, by default,
-                            normalized, but other channels will be even if you
-                            are using cells, unless you set this flag to False.
-        --calibration_dict: Dictionary of calibrations you want to use to
-                                convert AFU readings to uM measurements, as
-                                returned by calibration_data. Default none,
-                                in which case the most recent calibration will
-                                be used for each channel.
-        --override_plate_reader_id: If not None, the plate reader ID will be
-                                        set to this. Default None.
-    Returns: None
-    Side Effects: Creates a new CSV with the same name as the data file with
-                    "_tidy" appended to the end. This new file is in tidy
-                    format, with each row representing a single channel read
-                    from a single well at a single time.
 
+class BiotekStore(object):
+    '''
+    A SQLite database of tidy Biotek data from many plates, for picking out
+    data across experiments without loading all of it into memory.
+
+    Each plate's tidy data is stored under a plate (or run) ID, along with any
+    per-well metadata columns from its supplementary file. Channel, Gain, Well,
+    time and every metadata column are indexed, and query() turns its filters
+    into SQL, so only matching rows are ever read.
+
+    Usage:
+        store = BiotekStore("experiments.db")
+        store.add_file("180515_plate_tidy.csv")
+        df = store.query(channel = "deGFP", gain = 61, endpoints = True,
+                         metadata = {"Construct": "pBEST", "ATC (nM)": 10})
     '''
-    if volume == None:
-        print("Assuming default volume 10 uL. Make sure this is what you want!")
-        volume = 10.0
 
-    supplementary_data = dict()
-    if supplementary_filename:
-        supplementary_data = read_supplementary_info(supplementary_filename)
-    filename_base   = input_filename.rsplit('.', 1)[0]
-    output_filename = filename_base + "_tidy.csv"
+    tidy_columns = ['Channel', 'Gain', 'Time (sec)', 'Time (hr)', 'Well',
+                    'Measurement', 'Units', 'Excitation', 'Emission',
+                    'ChanStr']
 
-    if calibration_dict is None:
-        calibration_dict = calibration_data()
-
-    # If the user gave you an excel file, convert it to a CSV so we can read
-    # it properly.
-    file_extension = input_filename.rpartition(".")[2]
-    if file_extension.startswith("xls"):
-        excel_filename = input_filename
-        input_filename = excel_filename.rpartition(".")[0] + ".csv"
-        pd.read_excel(excel_filename).to_csv(input_filename, index = False)
-
-    # Open data file and tidy output file at once, so that we can stream data
-    # directly from one to the other without having to store much.
-    with mt_open(input_filename, 'rU') as infile:
-        with mt_open(output_filename, 'w') as outfile:
-            # Write a header to the tidy output file.
-            reader = csv.reader(infile)
-            writer = csv.writer(outfile, delimiter = ',')
-            title_row = ['Channel', 'Gain', 'Time (sec)', 'Time (hr)', 'Well',
-                         'Measurement', 'Units', 'Excitation', 'Emission']
-            for name in supplementary_data.keys():
-                title_row.append(name)
-            title_row.append('ChanStr')
-            writer.writerow(title_row)
-
-            # Read plate information
-            # Basic reading flow looks like:
-            #   1) Read lines until a line that reads "Read", recording
-            #       information about plate reader ID.
-            #   2) For each line until the next line that reads "Layout":
-            #       2.1) Look for a line starting with "Filter Set:"
-            #       2.2) Get read set information from next two lines, store it.
-            #   3) Read lines until the line that reads "Layout", looking for
-            #       information about read settings.
-            #   4) For each line:
-            #       4.1) If line contains information about this read setting,
-            #               store it.
-            #       4.2) If line is the start of data, then for each line until
-            #             empty line:
-            #           4.2.1) Rewrite data on that line to tidy data file,
-            #                   converting to uM if possible.
-            read_sets = dict()
-            next_line = ""
-            while True:
-                if next_line != "":
-                    line = next_line
-                    next_line = ""
-                else:
-                    try:
-                        line = next(reader)
-                    except StopIteration:
-                        break
-                if len(line) == 0:
-                    continue
-                if line[0].strip() == "Reader Serial Number:":
-                    if override_plate_reader_id != None:
-                            warnings.warn(("Plate reader id overridden to be '%s'") \
-                                    % overrride_plate_reader_id)
-                            plate_reader_id= overrride_plate_reader_id
-                    elif line[1] in plate_reader_ids:
-                        plate_reader_id = plate_reader_ids[line[1]]
-                    else:
-                        warnings.warn(("Unknown plate reader id '%s'; will " + \
-                                      "not attempt to calculate molarity "   + \
-                                      "concentrations.") % line[1])
-                        plate_reader_id = None
-                    continue
-                if line[0].strip() == "Read":
-                    if line[1].strip() == "Fluorescence Endpoint":
-                        read_name = ""
-                    else:
-                        read_name = line[1].strip()
-                    entered_layout = False
-                    hit_data       = False
-
-                    # Process all the information for this read set into one
-                    # solid text block, which we will search for relevant
-                    # information
-                    read_information_block = ""
-                    for line in reader:
-                        if len(line) == 0:
-                            continue
-                        if line[0].strip() == "Layout":
-                            entered_layout = True
-                            break
-                        maybe_read_name = line[0].split(":")[0].strip()
-                        if maybe_read_name in read_sets.keys() or \
-                           maybe_read_name.startswith("OD"):
-                            hit_data = True
-                            break
-                        if line[0].strip() == "Read":
-                            next_line = line
-                            break
-                        line[-1] = line[-1].strip()
-                        read_information_block += ",".join(line)
-
-                    # Now go through the block to figure out information for the
-                    # read set.
-                    info_parts = read_information_block.split(",")
-                    for idx in range(len(info_parts)):
-                        block = info_parts[idx]
-                        block = block.strip()
-                        if block.startswith("Wavelengths"):
-                            emission = int(block.split(":")[-1].strip()\
-                                           .split("/")[0].strip())
-                            excitation = emission
-                        if block.startswith("Filter Set"):
-                            for i in range(idx+1, len(info_parts)):
-                                sub_block = info_parts[i]
-                                sub_block = sub_block.strip()
-                                if sub_block.startswith("Excitation"):
-                                    excitation = int(sub_block.split(":")[-1]\
-                                                     .split("/")[0].strip())
-                                if sub_block.startswith("Emission"):
-                                    emission = int(sub_block.split(":")[-1]\
-                                                     .split("/")[0].strip())
-                                if sub_block.startswith("Gain"):
-                                    gain = sub_block.split(",")[-1]\
-                                           .split(":")[-1].strip()
-                                    if gain != "AutoScale":
-                                        gain = int(gain)
-                                if sub_block.startswith("Filter Set"):
-                                    break
-                            if not read_name in read_sets:
-                                read_sets[read_name] = []
-                            read_sets[read_name].append(ReadSet(read_name,
-                                                            excitation,
-                                                            emission, gain))
-                    if entered_layout or hit_data:
-                        break
-            # Read data blocks
-            # Find a data block
-            while line != None:
-                info = line[0].strip()
-                if info == "":
-                    line = next(reader, None)
-                    continue
-                if info in ["Layout", "Results"]:
-                    line = next(reader, None)
-                    continue
-                if info.upper().startswith("OD"):
-                    reading_OD = True
-                else:
-                    reading_OD = False
-                if reading_OD:
-                    read_name = info.split(":")[0].strip()
-                    excitation = int(info.split(":")[1])
-                    emission   = -1
-                    gain       = -1
-                else:
-                    if ":" in info:
-                        info_parts = info.split(":")
-                        read_name  = info_parts[0]
-                    else:
-                        info_parts = [info]
-                        read_name = ""
-                    if not info.endswith(']'):
-                        read_idx = 0
-                    else:
-                        read_idx = int(info.split('[')[-1][:-1]) - 1
-                    read_properties = read_sets[read_name][read_idx]
-                    gain            = read_properties.gain
-                    if len(info_parts) > 1:
-                        excitation = info_parts[1].split("[")[0].split(",")[0]
-                        excitation = int(excitation)
-                        emission   = info_parts[1].split("[")[0].split(",")[1]
-                        emission   = int(emission)
-                    else:
-                        excitation      = read_properties.excitation
-                        emission        = read_properties.emission
-
-                line = next(reader) # Skip a line
-                line = next(reader) # Chart title line
-                well_names = line
-                # Data lines
-                for line in reader:
-                    if line[1] == "":
-                        break
-                    raw_time = line[1]
-                    time_parts = raw_time.split(':')
-                    days=0
-                    minutes=int(time_parts[1])
-                    seconds=int(time_parts[2])
-
-                    if("1900" in raw_time):
-                      tstamp=pd.to_datetime(raw_time)
-                      days=tstamp.day
-                      hours=int(tstamp.hour)+24*days
-                    else:
-                      hours=int(time_parts[0])
-                    time_secs = int(seconds) + 60*int(minutes) \
-                                + 3600*int(hours)
-
-                    time_hrs = time_secs / 3600.0
-                    temp = line[2]
-                    for i in range(3,len(line)):
-                        if line[i].strip() == "":
-                            continue
-                        well_name = well_names[i]
-                        # Check to see if there's any supplementary information
-                        # on this well.
-                        if supplementary_filename and \
-                          not well_name in list(supplementary_data.values())[0]:
-                            warnings.warn("No supplementary data for well " + \
-                                        "%s; throwing out data for that well."\
-                                          % well_name)
-                            continue
-                        afu = line[i]
-                        # Check for overflow
-                        if afu.upper() == "OVRFLW":
-                            afu = np.infty
-                        if reading_OD:
-                            measurement = afu
-                            units = "absorbance"
-                        else:
-                            if(convert_to_uM):
-                                uM = raw_to_uM(calibration_dict, line[i],
-                                               read_name, plate_reader_id, gain,
-                                               volume)
-                            else:
-                                uM = None
-                            if uM != None:
-                                measurement = uM
-                                units = "uM"
-                            else:
-                                measurement = afu
-                                units = "AFU"
-                        row = [read_name, gain, time_secs, time_hrs, well_name,
-                               measurement, units, str(excitation),
-                               str(emission)]
-
-                        for name in supplementary_data.keys():
-                            row.append(supplementary_data[name][well_name])
-                        row.append(read_name + str(gain) + str(excitation) +\
-                                   str(emission))
-                        try:
-                            writer.writerow(row)
-                        except TypeError as e:
-                            print("Error writing line: " + str(row))
-                            raise e
-                line = next(reader, None)
+    def __init__(self, filename):
+        '''
+        Params:
+            filename: Name of the SQLite database file. Created if it doesn't
+                        exist. ":memory:" gives a temporary in-memory store.
+        '''
+        self.filename   = filename
+        self.connection = sqlite3.connect(filename)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS plates ' \
+                                    + '(Plate TEXT PRIMARY KEY, Rows INTEGER,'\
+                                    + ' Added TEXT)')
+            # Columns are declared without types, so values are stored as
+            # given (e.g. a Gain column can hold both 61 and "AutoScale").
+            self.connection.execute('CREATE TABLE IF NOT EXISTS data (' \
+                    + ", ".join(_sql_name(c) for c in \
+                                ["Plate"] + self.tidy_columns) + ')')
+            for columns in [["Plate"], ["Channel", "Gain"], ["Well"],
+                            ["Time (sec)"], ["Time (hr)"],
+                            ["Plate", "ChanStr", "Well", "Time (sec)"]]:
+                self._create_index(columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _create_index(self, columns):
+        # Column names can hold anything, so name indexes by a hash of them.
+        index_name = "idx_" + hashlib.sha1("|".join(columns).encode())\
+                                     .hexdigest()[:16]
+        self.connection.execute("CREATE INDEX IF NOT EXISTS %s ON data (%s)" \
+                                % (index_name,
+                                   ", ".join(_sql_name(c) for c in columns)))
+
+    @property
+    def columns(self):
+        '''
+        Names of all columns in the store (Plate, the tidy columns, then every
+        metadata column seen so far).
+        '''
+        return [row[1] for row in \
+                self.connection.execute("PRAGMA table_info(data)")]
+
+    @property
+    def metadata_columns(self):
+        '''
+        Names of all metadata columns in the store.
+        '''
+        return [c for c in self.columns \
+                if not c in ["Plate"] + self.tidy_columns]
+
+    def plates(self):
+        '''
+        Returns a DataFrame listing the plates in the store, with how many rows
+        each has and when it was added.
+        '''
+        return pd.read_sql_query("SELECT * FROM plates ORDER BY rowid",
+                                 self.connection)
+
+    def add(self, df, plate = None, replace = False):
+        '''
+        Adds tidy data to the store.
+
+        Params:
+            df: DataFrame of tidy data, as returned by tidy_biotek_df or
+                    read_tidy_biotek_data. Columns other than the standard
+                    tidy columns are stored as (indexed) metadata.
+            plate: ID of the plate (or run) the data comes from. May be left
+                    as None if df has a "Plate" column (as tidy_many adds),
+                    in which case each plate in it is added separately.
+            replace: If True, replaces any data already stored for the same
+                        plate ID. Default False, in which case adding a plate
+                        ID that's already in the store raises a ValueError.
+        '''
+        missing = [c for c in self.tidy_columns if not c in df.columns]
+        if missing:
+            raise ValueError("Not tidy Biotek data; missing column(s) %s." \
+                             % ", ".join(missing))
+        if plate is None:
+            if not "Plate" in df.columns:
+                raise ValueError("No plate ID given, and data has no 'Plate' "
+                                 "column.")
+            plate_ids = df["Plate"].astype(str)
+            with self.connection:
+                for plate_id, plate_df in df.groupby(plate_ids, sort = False):
+                    self._add_plate(plate_df.drop("Plate", axis = 1),
+                                    plate_id, replace)
+            return
+        with self.connection:
+            self._add_plate(df.drop("Plate", axis = 1, errors = "ignore"),
+                            str(plate), replace)
+
+    def _add_plate(self, df, plate, replace):
+        '''
+        Adds a single plate's data. Must be called inside a transaction.
+        '''
+        exists = self.connection.execute("SELECT 1 FROM plates WHERE " \
+                                         + "Plate = ?", (plate,)).fetchone()
+        if exists:
+            if not replace:
+                raise ValueError(("Plate '%s' is already in the store; use " \
+                                  + "replace = True to replace it.") % plate)
+            self._remove_plate(plate)
+
+        # Make room (and indexes) for any new metadata columns.
+        known_columns = self.columns
+        for name in df.columns:
+            if not name in known_columns:
+                self.connection.execute("ALTER TABLE data ADD COLUMN %s" \
+                                        % _sql_name(name))
+                self._create_index([name])
+
+        names  = ["Plate"] + list(df.columns)
+        values = [[plate] * len(df)] + [_sql_values(df[name]) \
+                                        for name in df.columns]
+        self.connection.executemany("INSERT INTO data (%s) VALUES (%s)" \
+                                    % (", ".join(_sql_name(n) for n in names),
+                                       ", ".join("?" * len(names))),
+                                    zip(*values))
+        self.connection.execute("INSERT INTO plates VALUES (?, ?, ?)",
+                                (plate, len(df), datetime.now().isoformat()))
+
+    def add_file(self, input_filename, plate = None, replace = False,
+                 **kwargs):
+        '''
+        Adds the data in a tidy file (CSV, parquet or feather; see
+        read_tidy_biotek_data) or a raw Biotek output file to the store. Raw
+        files are tidied with tidy_biotek_df first.
+
+        Params:
+            input_filename: Name of the file.
+            plate: Plate ID. Default None, in which case the file's name,
+                    without directory, extension or "_tidy", is used.
+            replace: See add.
+            **kwargs: Extra arguments to tidy_biotek_df (supplementary_filename,
+                        volume, etc.), for raw files.
+        '''
+        base = os.path.basename(input_filename).rsplit('.', 1)[0]
+        if base.endswith("_tidy"):
+            df = read_tidy_biotek_data(input_filename)
+            base = base[:-len("_tidy")]
+        else:
+            df = tidy_biotek_df(input_filename, **kwargs)
+        self.add(df, base if plate is None else plate, replace)
+
+    def _remove_plate(self, plate):
+        self.connection.execute("DELETE FROM data WHERE Plate = ?", (plate,))
+        self.connection.execute("DELETE FROM plates WHERE Plate = ?", (plate,))
+
+    def remove(self, plate):
+        '''
+        Deletes all data for a plate ID.
+        '''
+        with self.connection:
+            self._remove_plate(str(plate))
+
+    def query(self, plates = None, channel = None, gain = None, wells = None,
+              start = None, end = None, units = "seconds", metadata = None,
+              endpoints = False, columns = None):
+        '''
+        Pulls tidy data out of the store. Every filter is done in SQL (using
+        the store's indexes), so only matching rows are read. Each filter may
+        be a single value or a list of allowed values; None means no filter.
+
+        Params:
+            plates: Plate ID(s) to get data from.
+            channel: Channel name(s) (e.g. "deGFP").
+            gain: Gain(s).
+            wells: Well name(s).
+            start, end: Only get data measured in this time window (each end
+                            inclusive, and either may be None).
+            units: Units of start and end; either "seconds" (default) or
+                    "hours".
+            metadata: Dictionary mapping metadata column names to the value(s)
+                        to get, e.g. {"Construct": "pBEST", "ATC (nM)": 10}.
+            endpoints: If True, only returns the last measurement of each
+                        series (plate, channel, well) in the time window.
+                        Default False.
+            columns: Columns to return. Default None, in which case Plate, the
+                        tidy columns, and every metadata column that isn't
+                        empty for the matching rows are returned.
+        Returns: A DataFrame of matching rows, in the order they were added.
+        '''
+        if units.lower() == "seconds":
+            time_col = "Time (sec)"
+        elif units.lower() == "hours":
+            time_col = "Time (hr)"
+        else:
+            raise ValueError(('Unknown unit "{0}"; units must be "seconds" ' \
+                              + 'or "hours"').format(units))
+        known_columns = self.columns
+        filters = [("Plate", plates), ("Channel", channel), ("Gain", gain),
+                   ("Well", wells)]
+        for name, values in (metadata or dict()).items():
+            if not name in known_columns:
+                raise ValueError("No metadata column '%s' in the store." \
+                                 % name)
+            filters.append((name, values))
+
+        conditions = []
+        params     = []
+        for name, values in filters:
+            if values is None:
+                continue
+            if isinstance(values, (str, bytes)) or np.ndim(values) == 0:
+                values = [values]
+            values = [v.item() if isinstance(v, np.generic) else v \
+                      for v in values]
+            conditions.append("%s IN (%s)" % (_sql_name(name),
+                                              ", ".join("?" * len(values))))
+            params += values
+        for bound, op in [(start, ">="), (end, "<=")]:
+            if bound is not None:
+                conditions.append("%s %s ?" % (_sql_name(time_col), op))
+                params.append(bound)
+        where = " AND ".join(conditions) if conditions else "1"
+
+        if columns is None:
+            selected = "*"
+        else:
+            for name in columns:
+                if not name in known_columns:
+                    raise ValueError("No column '%s' in the store." % name)
+            selected = ", ".join(_sql_name(c) for c in columns)
+        if endpoints:
+            series = ", ".join(_sql_name(c) for c in \
+                               ["Plate", "ChanStr", "Well"])
+            sql = ("SELECT %s FROM data WHERE rowid IN (SELECT rowid FROM "
+                   "(SELECT rowid, %s, MAX(%s) FROM data WHERE %s GROUP BY "
+                   "%s)) ORDER BY rowid") \
+                  % (selected, series, _sql_name("Time (sec)"), where, series)
+        else:
+            sql = "SELECT %s FROM data WHERE %s ORDER BY rowid" \
+                  % (selected, where)
+        df = pd.read_sql_query(sql, self.connection, params = params)
+        if columns is None:
+            # Same column order as tidy data, with Plate first.
+            metadata_columns = [c for c in self.metadata_columns \
+                                if not df[c].isnull().all()]
+            df = df[["Plate"] + self.tidy_columns[:-1] + metadata_columns \
+                    + ["ChanStr"]]
+        return df
+
+
+class PlateCube(object):
+    '''
+    Dense form of tidy Biotek data: a (channel x well x timepoint) array of
+    measurements, with a matching array of measurement times.
+
+    A "channel" is one combination of Channel, Gain, Excitation and Emission; a
+    "well" is one combination of Well and any grouping variables (e.g. a plate
+    ID column, for data from more than one plate). Series of different lengths
+    are padded out with NaN, and mask marks which entries hold real
+    measurements.
+
+    Attributes:
+        data -- Float array of shape (n_channels, n_wells, n_times).
+        times -- Array of measurement times in seconds, same shape as data.
+        mask -- Boolean array, True where there's a measurement.
+        rows -- Integer array, same shape as data, giving the position (as for
+                    DataFrame.iloc) of each measurement's row in the tidy
+                    DataFrame the cube was built from, or -1 for padding.
+                    None if the cube wasn't built from a DataFrame.
+        channel_info -- DataFrame with one row per channel (Channel, Gain,
+                            Excitation, Emission, plus Units and ChanStr if
+                            present).
+        well_info -- DataFrame with one row per well (Well, grouping variables
+                        and any other per-well metadata, such as supplementary
+                        data).
+        column -- Name of the tidy column data came from.
+    '''
+
+    channel_columns = ["Channel", "Gain", "Excitation", "Emission"]
+
+    def __init__(self, data, times, mask, channel_info, well_info,
+                 column = "Measurement", columns = None,
+                 grouping_variables = None, rows = None):
+        self.data         = data
+        self.times        = times
+        self.mask         = mask
+        self.channel_info = channel_info
+        self.well_info    = well_info
+        self.column       = column
+        self.columns      = columns
+        self.grouping_variables = list(grouping_variables) \
+                                  if grouping_variables else []
+        self.rows         = rows
+
+    @classmethod
+    def from_tidy(cls, df, column = "Measurement", grouping_variables = None):
+        '''
+        Builds a PlateCube from a tidy DataFrame.
+
+        Params:
+            df -- DataFrame of Biotek data, of the form produced by
+                    tidy_biotek_data.
+            column -- Column holding the data to pack into the cube. Default
+                        "Measurement".
+            grouping_variables -- Optional list of column names that, along
+                                    with Well, identify a single well. Use this
+                                    option primarily to separate multiple
+                                    plates' worth of data with overlapping
+                                    wells. Rows with a missing (NaN) value in
+                                    any of these columns are left out of the
+                                    cube.
+        Returns: A new PlateCube.
+        '''
+        grouping_variables = list(grouping_variables) \
+                             if grouping_variables else []
+        channel_cols = [c for c in cls.channel_columns if c in df.columns]
+        well_cols    = ["Well"] + grouping_variables
+
+        # Rows with a missing (NaN) channel or well label don't belong to any
+        # series, and are left out.
+        channel_idx = df.groupby(channel_cols, sort = False, observed = True)\
+                        .ngroup().to_numpy(dtype = float)
+        well_idx    = df.groupby(well_cols, sort = False, observed = True)\
+                        .ngroup().to_numpy(dtype = float)
+        positions   = np.flatnonzero(~np.isnan(channel_idx) \
+                                     & ~np.isnan(well_idx) \
+                                     & (channel_idx >= 0) & (well_idx >= 0))
+        channel_idx = channel_idx[positions].astype(np.int64)
+        well_idx    = well_idx[positions].astype(np.int64)
+        times       = df["Time (sec)"].to_numpy(dtype = float)[positions]
+        order       = np.lexsort((times, well_idx, channel_idx))
+        n_channels  = channel_idx.max() + 1 if len(positions) > 0 else 0
+        n_wells     = well_idx.max() + 1 if len(positions) > 0 else 0
+
+        # Position of each row in its own series, once sorted by time.
+        series_idx  = channel_idx[order] * n_wells + well_idx[order]
+        starts      = np.r_[0, np.flatnonzero(np.diff(series_idx)) + 1]
+        lengths     = np.diff(np.r_[starts, len(order)])
+        time_idx    = np.arange(len(order)) - np.repeat(starts, lengths)
+
+        shape = (n_channels, n_wells, time_idx.max() + 1) \
+                if len(positions) > 0 else (0, 0, 0)
+        data       = np.full(shape, np.nan)
+        cube_times = np.full(shape, np.nan)
+        mask       = np.zeros(shape, dtype = bool)
+        rows       = np.full(shape, -1, dtype = np.int64)
+        c, w = channel_idx[order], well_idx[order]
+        data[c, w, time_idx]       = df[column].to_numpy(dtype = float)\
+                                                [positions[order]]
+        cube_times[c, w, time_idx] = times[order]
+        mask[c, w, time_idx]       = True
+        rows[c, w, time_idx]       = positions[order]
+
+        # Per-channel and per-well descriptions, taken from each one's first
+        # row.
+        first_rows = lambda idx: positions[np.unique(idx,
+                                                     return_index = True)[1]]
+        info_cols = channel_cols + [c for c in ["Units", "ChanStr"] \
+                                    if c in df.columns]
+        channel_info = df[info_cols].iloc[first_rows(channel_idx)]\
+                         .reset_index(drop = True)
+        per_well_cols = [c for c in df.columns \
+                         if c not in info_cols + [column, "Time (sec)",
+                                                  "Time (hr)"]]
+        well_info = df[per_well_cols].iloc[first_rows(well_idx)]\
+                      .reset_index(drop = True)
+
+        return cls(data, cube_times, mask, channel_info, well_info, column,
+                   list(df.columns), grouping_variables, rows)
+
+    def to_tidy(self, column = None):
+        '''
+        Converts the cube back into a tidy DataFrame, with one row per
+        measurement (padding is dropped). Rows are ordered by channel, then
+        well, then time.
+
+        Params:
+            column -- Name of the column to put data in. Default None, in which
+                        case the cube's own column is used.
+        Returns: A tidy DataFrame.
+        '''
+        column = column or self.column
+        c, w, t = np.nonzero(self.mask)
+        df = pd.concat([self.channel_info.iloc[c].reset_index(drop = True),
+                        self.well_info.iloc[w].reset_index(drop = True)],
+                       axis = 1)
+        times = self.times[c, w, t]
+        if np.all(times == np.round(times)):
+            df["Time (sec)"] = times.astype(np.int64)
+        else:
+            df["Time (sec)"] = times
+        df["Time (hr)"]  = times / 3600.0
+        df[column]       = self.data[c, w, t]
+        if self.columns is not None:
+            order = [name for name in self.columns if name in df.columns]
+            order += [name for name in df.columns if name not in order]
+            df = df[order]
+        return df
+
+    def copy(self, data = None, column = None):
+        '''
+        Returns a copy of this cube, optionally with new data (of the same
+        shape) and/or a new column name.
+        '''
+        return PlateCube(self.data.copy() if data is None else data,
+                         self.times.copy(), self.mask.copy(),
+                         self.channel_info.copy(), self.well_info.copy(),
+                         column or self.column,
+                         None if self.columns is None else list(self.columns),
+                         self.grouping_variables,
+                         None if self.rows is None else self.rows.copy())
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def hours(self):
+        '''
+        Measurement times, in hours.
+        '''
+        return self.times / 3600.0
+
+    def channel_index(self, channel, gain = None):
+        '''
+        Index (along the first axis) of a channel, by name and (if the name is
+        ambiguous) gain.
+        '''
+        matches = self.channel_info.Channel == channel
+        if gain is not None:
+            matches &= self.channel_info.Gain == gain
+        idxs = np.flatnonzero(matches.to_numpy())
+        if len(idxs) == 0:
+            raise ValueError("No data for channel '%s' with gain %s." \
+                             % (channel, gain))
+        if len(idxs) > 1:
+            raise ValueError(("Channel '%s' is read at more than one gain; " \
+                              + "specify a gain.") % channel)
+        return idxs[0]
+
+    def select(self, channel, gain = None):
+        '''
+        Returns the (n_wells x n_times) data array for a single channel.
+        '''
+        return self.data[self.channel_index(channel, gain)]
 
 
 def extract_trajectories_only(df):
@@ -475,6 +2526,13 @@ def extract_trajectories_only(df):
     Assumptions:
         - The time is in a channel called 'Time (hr)', which becomes Time
         - There is at least 1 measured channel
+        - Every channel has the same number of measurements in each well.
+            Measurements are matched up by their order within each well, and
+            times are taken from the first channel.
+
+    Channels read at more than one gain (or with more than one set of
+    excitation/emission wavelengths) get one column per reading, named by
+    their ChanStr; other channels' columns are named by the channel name.
 
     Arguments:
         df -- DataFrame of Biotek data, pulled from a tidy dataset of the form
@@ -483,79 +2541,101 @@ def extract_trajectories_only(df):
                 measured channel, in whatever units they were in the original
                 DataFrame.
     '''
-    # Create dictionary to make new data-frame
-    master_dict = {}
-    master_dict['Time'] = []
-    master_dict['Well'] = []
-
-    # get all channel names and initialize columns
-    all_channels = df.Channel.unique()
-    for channel in all_channels:
-        master_dict[channel] = []
-
-    all_wells = df.Well.unique()
-
-    # go through and build the trajectory for each well.
-    for well in all_wells:
-        well_df = df[df.Well == well]
-        time_series = well_df[well_df.Channel == all_channels[0]]['Time (hr)']
-        series_length = len(time_series)
-        well_series = [well] * series_length
-
-        master_dict['Time'].extend(time_series)
-        master_dict['Well'].extend(well_series)
-        for channel in all_channels:
-            channel_series = well_df[well_df.Channel == channel].Measurement
-            assert (len(channel_series) == series_length)
-            master_dict[channel].extend(channel_series)
-
-    return_df = pd.DataFrame(master_dict)
+    # Name each reading by its channel, unless that's ambiguous.
+    ambiguous = df.groupby("Channel", observed = True).ChanStr.nunique() > 1
+    labels = np.where(df.Channel.map(ambiguous).to_numpy(dtype = bool),
+                      df.ChanStr.astype(str), df.Channel.astype(str))
+    labels = pd.Categorical(labels, categories = pd.unique(labels))
+    wells  = pd.Categorical(df.Well.astype(str),
+                            categories = pd.unique(df.Well.astype(str)))
+    long_df = pd.DataFrame({"Well": wells, "Channel": labels,
+                            "Time": df["Time (hr)"].to_numpy(),
+                            "Measurement": df.Measurement.to_numpy()})
+    long_df["Frame"] = long_df.groupby(["Well", "Channel"]).cumcount()
+
+    # Every channel needs the same number of measurements in each well.
+    counts = long_df.groupby(["Well", "Channel"]).size().unstack("Channel")
+    misaligned = counts[counts.nunique(axis = 1) > 1]
+    if len(misaligned) > 0:
+        raise ValueError(("Channels have different numbers of measurements " \
+                          + "in %d well(s); measurement counts:\n%s") \
+                         % (len(misaligned), misaligned.head()))
+
+    indexed_df = long_df.set_index(["Well", "Frame", "Channel"])
+    wide_df    = indexed_df.Measurement.unstack("Channel")
+    times      = indexed_df.Time.xs(labels.categories[0], level = "Channel")
+    return_df  = pd.DataFrame({
+                    "Time": times.reindex(wide_df.index).to_numpy(),
+                    "Well": wide_df.index.get_level_values("Well")\
+                                          .astype(object)})
+    for channel in labels.categories:
+        return_df[channel] = wide_df[channel].to_numpy()
     return return_df
 
 
-def background_subtract(df, negative_control_wells):
+def background_subtract(df, negative_control_wells, grouping_variables = None,
+                        missing_background = "raise"):
     '''
     Create a new version of a dataframe with background removed. Background is
     inferred from one or more negative control wells. If more than one negative
     control is specified, the average of the wells is used as a background
     value.
 
-    Note that this function assumes that every measurement has a corresponding
-    negative control measurement in each of the negative control wells (same
-    channel and gain).
+    Background is matched to measurements by channel, gain and time, so every
+    measurement needs a negative control measurement with the same channel,
+    gain and time (which is always the case for wells read in the same run).
+    What happens to measurements without one is set by missing_background.
 
     Arguments:
         df -- DataFrame of Biotek data, pulled from a tidy dataset of the form
                 produced by tidy_biotek_data.
         negative_control_wells -- String or iterable of Strings specifying one
                                     or more negative control wells.
-    Returns: A new DataFrame with background subtracted out.
+        grouping_variables -- Optional list of column names on which to group.
+                                Use this option primarily to separate multiple
+                                plates' worth of data with overlapping wells;
+                                each plate is then background-subtracted using
+                                its own negative controls.
+        missing_background -- What to do with measurements that have no
+                                matching negative control measurement. One of
+                                "raise" (default; raise a ValueError), "nan"
+                                (set those measurements to NaN) or "drop"
+                                (leave those measurements out).
+    Returns: A new DataFrame with background subtracted out, with the same
+                index as df (less any dropped measurements).
     '''
+    if not missing_background in ["raise", "nan", "drop"]:
+        raise ValueError(('Unknown option "{0}"; missing_background must be ' \
+                          + '"raise", "nan", or "drop"')\
+                         .format(missing_background))
     if type(negative_control_wells) == str:
         negative_control_wells = [negative_control_wells]
-    return_df = pd.DataFrame()
-    # Split the dataframe by channel and gain
-    for channel in df.Channel.unique():
-        channel_df = df[df.Channel == channel]
-        for gain in channel_df.Gain.unique():
-            condition_df = channel_df[channel_df.Gain == gain]
-            neg_ctrl_df  = pd.DataFrame()
-            for well in negative_control_wells:
-                well_df = condition_df[condition_df.Well == well]
-                neg_ctrl_df = neg_ctrl_df.append(well_df)
-            grouped_neg_ctrl = neg_ctrl_df.groupby(["Time (sec)"])
-            avg_neg_ctrl = grouped_neg_ctrl.aggregate(np.average)
-            avg_neg_ctrl.sort_index(inplace = True)
-            avg_neg_ctrl.reset_index(inplace = True)
-            # Easiest thing to do is to apply the background subtraction to each
-            # well separately
-            for well in condition_df.Well.unique():
-                well_df = condition_df[condition_df.Well == well].copy()
-                well_df.sort_values("Time (sec)", inplace = True)
-                well_df.reset_index(inplace = True)
-                well_df.Measurement = well_df.Measurement - \
-                                      avg_neg_ctrl.Measurement
-                return_df = return_df.append(well_df)
+    keys = ["Channel", "Gain", "Time (sec)"]
+    if grouping_variables:
+        keys += grouping_variables
+
+    # Average negative control measurements at each channel/gain/time, then
+    # look up the background for every measurement at once.
+    neg_ctrl_df = df[df.Well.isin(negative_control_wells)]
+    background  = neg_ctrl_df.groupby(keys, observed = True)\
+                             .Measurement.mean()
+    if len(keys) == 1:
+        lookup = pd.Index(df[keys[0]])
+    else:
+        lookup = pd.MultiIndex.from_arrays([df[k] for k in keys], names = keys)
+    background = background.reindex(lookup).to_numpy()
+
+    return_df = df.copy()
+    return_df["Measurement"] = df.Measurement.to_numpy() - background
+    missing = np.isnan(background)
+    if missing.any():
+        if missing_background == "raise":
+            missing_df = df[missing][keys].drop_duplicates()
+            raise ValueError(("No negative control measurement for %d " \
+                              + "channel/gain/time combination(s), e.g.:\n%s")\
+                             % (len(missing_df), missing_df.head()))
+        elif missing_background == "drop":
+            return_df = return_df[~missing]
     return return_df
 
 
@@ -579,6 +2659,186 @@ def logistic_growth(t, rate, cap, floor, init):
     return floor + cap * init * np.exp(rate * t) \
             / (cap + init * (np.exp(rate * t) - 1))
 
+def _logistic_growth_jacobian(t, rate, cap, floor, init):
+    '''
+    Partial derivatives of logistic_growth with respect to (rate, cap, floor,
+    init), stacked along a new last axis. Parameters may be arrays that
+    broadcast against t.
+    '''
+    rate = np.abs(rate)
+    init = np.abs(init)
+    cap  = np.abs(cap)
+    # Written in terms of exp(-rate * t), which can't overflow for t >= 0.
+    decay = np.exp(-rate * t)
+    denom = (init + (cap - init) * decay)**2
+    d_rate  = cap * init * (cap - init) * t * decay / denom
+    d_cap   = init**2 * (1 - decay) / denom
+    d_floor = np.ones_like(d_cap)
+    d_init  = cap**2 * decay / denom
+    return np.stack([d_rate, d_cap, d_floor, d_init], axis = -1)
+
+def _logistic_growth_guess(times, values, mask):
+    '''
+    Data-driven initial guesses for logistic_growth parameters, for a batch of
+    time series.
+
+    Params:
+        times, values -- (n_series x n_times) arrays of times (in hours) and
+                            measurements, each row sorted by time.
+        mask -- Boolean array of the same shape, True where there's data.
+    Returns: An (n_series x 4) array of (rate, cap, floor, init) guesses.
+    '''
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        masked = np.where(mask, values, np.nan)
+        floor  = np.nanmin(masked, axis = 1)
+        cap    = np.nanmax(masked, axis = 1) - floor
+        cap    = np.where(cap > 0, cap, 1.0)
+        # Time at which each series first crosses a fraction of the way from
+        # its floor to its maximum.
+        rows = np.arange(len(times))
+        crossing = lambda frac: times[rows, np.argmax(
+                        mask & (values >= (floor + frac * cap)[:, None]),
+                        axis = 1)]
+        # Logistic growth takes 2 * ln(9) / rate to go from 10% to 90% grown.
+        rate   = 2 * np.log(9) / (crossing(0.9) - crossing(0.1))
+        rate   = np.where(np.isfinite(rate) & (rate > 0), rate, 1.0)
+        # Pick init so that the curve is half grown at the halfway crossing.
+        init   = cap / (1 + np.exp(np.minimum(rate * crossing(0.5), 50)))
+    return np.stack([rate, cap, floor, init], axis = -1)
+
+def _fit_logistic_growth_batch(times, values, mask, fixed_init = None,
+                               max_iter = 200, ftol = 1.49012e-8,
+                               xtol = 1.49012e-8):
+    '''
+    Fits logistic_growth to a batch of time series at once, with a
+    Levenberg-Marquardt iteration run on every series in parallel.
+
+    Params:
+        times, values, mask -- (n_series x n_times) arrays, as for
+                                _logistic_growth_guess.
+        fixed_init -- If not None, the init parameter is fixed to this value.
+        max_iter -- Maximum number of iterations.
+        ftol, xtol -- Relative tolerances on cost and parameter change, as in
+                        scipy.optimize.leastsq.
+    Returns: (params, converged), where params is an (n_series x 4) array of
+                fitted (rate, cap, floor, init) and converged is a boolean
+                array marking which series converged.
+    '''
+    n_params = 4 if fixed_init is None else 3
+    times  = np.where(mask, times, 0.0)
+    values = np.where(mask, values, 0.0)
+    params = _logistic_growth_guess(times, values, mask)[:, :n_params]
+    if fixed_init is not None:
+        fixed_init = np.full((len(params), 1), float(fixed_init))
+
+    def full_params(p):
+        p = p if fixed_init is None else np.hstack([p, fixed_init])
+        return [p[:, i, None] for i in range(4)]
+
+    def residuals(p):
+        with np.errstate(all = "ignore"):
+            res = (logistic_growth(times, *full_params(p)) - values) * mask
+            cost = (res**2).sum(axis = 1)
+        return res, np.where(np.isfinite(cost), cost, np.inf)
+
+    res, cost = residuals(params)
+    damping   = np.full(len(params), 1e-3)
+    active    = np.isfinite(cost) & (mask.sum(axis = 1) >= n_params)
+    converged = np.zeros(len(params), dtype = bool)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        with np.errstate(all = "ignore"):
+            # Chain rule through the absolute values in logistic_growth.
+            signs = np.where(params < 0, -1.0, 1.0)
+            jac = _logistic_growth_jacobian(times, *full_params(params))
+            jac = jac[..., :n_params] * signs[:, None, :] * mask[..., None]
+            jtj = np.einsum("wtp,wtq->wpq", jac, jac)
+            jtr = np.einsum("wtp,wt->wp", jac, res)
+            diag = np.diagonal(jtj, axis1 = 1, axis2 = 2)
+            diag = np.maximum(diag, 1e-12 * diag.max(axis = 1, keepdims = True)
+                                    + 1e-300)
+            lhs = jtj + damping[:, None, None] * \
+                  (diag[:, :, None] * np.eye(n_params))
+        ok = active & np.isfinite(lhs).all(axis = (1, 2)) \
+                    & np.isfinite(jtr).all(axis = 1)
+        step = np.zeros_like(params)
+        try:
+            step[ok] = np.linalg.solve(lhs[ok], -jtr[ok][..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step[ok] = np.einsum("wpq,wq->wp", np.linalg.pinv(lhs[ok]),
+                                 -jtr[ok])
+        new_params = params + step
+        new_res, new_cost = residuals(new_params)
+
+        better = ok & (new_cost <= cost)
+        small_step = np.sqrt((step**2).sum(axis = 1)) \
+                     <= xtol * (np.sqrt((params**2).sum(axis = 1)) + xtol)
+        small_gain = better & (cost - new_cost <= ftol * cost)
+        done = better & (small_step | small_gain)
+
+        params[better] = new_params[better]
+        res[better]    = new_res[better]
+        cost[better]   = new_cost[better]
+        damping = np.where(better, damping * 0.3, damping * 10)
+        converged |= done
+        active &= ~done & ok & (damping < 1e16)
+
+    params = np.abs(full_params(params))[..., 0].T
+    converged &= np.isfinite(params).all(axis = 1)
+    return params, converged
+
+def _fit_logistic_growth(times, values, fixed_init = None):
+    '''
+    Fits logistic_growth to a single time series with scipy's curve_fit,
+    starting from a data-driven guess and falling back on a generic guess if
+    that doesn't converge.
+
+    Returns: An array of fitted (rate, cap, floor, init).
+    '''
+    times  = np.asarray(times, dtype = float)
+    values = np.asarray(values, dtype = float)
+    guess = _logistic_growth_guess(times[None], values[None],
+                                   np.ones((1, len(times)), dtype = bool))[0]
+    # Some empirically-reasonable guesses for most growth experiments.
+    guesses = [guess, (1.3, 1, 0.05, 0)]
+    if fixed_init is None:
+        opt_func = logistic_growth
+    else:
+        guesses  = [g[:3] for g in guesses]
+        opt_func = lambda t, r, c, f: logistic_growth(t, r, c, f, fixed_init)
+
+    for i, param_guess in enumerate(guesses):
+        try:
+            opt_params = scipy.optimize.curve_fit(opt_func, times, values,
+                                                  p0 = param_guess,
+                                                  maxfev = int(1e4))[0]
+            break
+        except RuntimeError:
+            if i == len(guesses) - 1:
+                raise
+
+    # To keep parameters positive, logistic_growth uses the absolute value
+    # of whatever parameters it gets, so optimization will sometimes return
+    # negative parameter values; have to correct these.
+    opt_params = np.abs(opt_params)
+    if fixed_init is not None:
+        opt_params = np.append(opt_params, fixed_init)
+    return opt_params
+
+def _growth_threshold_time(rate, cap, init, growth_threshold):
+    '''
+    Time at which logistic growth (without its floor) reaches growth_threshold
+    times cap, in closed form. Negative if the population starts out above the
+    threshold.
+    '''
+    if not 0 < growth_threshold < 1:
+        raise ValueError("growth_threshold must be between 0 and 1; got %s" \
+                         % growth_threshold)
+    with np.errstate(all = "ignore"):
+        return np.log(growth_threshold * (cap - init) \
+                      / (init * (1 - growth_threshold))) / rate
+
 def summarize_single_well_growth(well_df, growth_threshold = None,
                                  fixed_init = None, verbose = False):
     '''
@@ -586,8 +2846,9 @@ def summarize_single_well_growth(well_df, growth_threshold = None,
     returning the results as a dictionary describing a single dataframe line.
     See summarize_growth for measurement details.
 
-    This function is intended as a helper function for summarize_growth; it uses
-    the helper function logistic_growth as a growth model.
+    This function fits one well at a time; summarize_growth fits every well at
+    once and is much faster for whole plates. It uses the helper function
+    logistic_growth as a growth model.
 
     Params:
         well_df -- A DataFrame of Biotek data from a single well and a single
@@ -604,42 +2865,24 @@ def summarize_single_well_growth(well_df, growth_threshold = None,
     Returns: A dictionary containing the well name, growth characteristics, and
                 any supplementary data from df.
     '''
-    well_df.reset_index(inplace = True)
+    well_df = well_df.sort_values("Time (hr)").reset_index(drop = True)
     if verbose:
         print("Summarizing from well %s" % well_df.Well[0])
 
-    # Some empirically-reasonable guesses for most growth experiments.
-    if fixed_init == None:
-        param_guess = (1.3, 1, 0.05, 0)
-        opt_func = logistic_growth
-    else:
-        param_guess = (1.3, 1, 0.05)
-        opt_func = lambda t, r, c, f: logistic_growth(t, r, c, f, fixed_init)
-
-    times = well_df["Time (hr)"]
-
-    opt_params = scipy.optimize.curve_fit(opt_func, times,
-                                          well_df["Measurement"],
-                                          p0 = param_guess,
-                                          maxfev = int(1e4))[0]
-
-    # To keep parameters positive, logistic_growth uses the absolute value
-    # of whatever parameters it gets, so optimization will sometimes return
-    # negative parameter values; have to correct these.
-    opt_params = np.abs(opt_params)
+    opt_params = _fit_logistic_growth(well_df["Time (hr)"],
+                                      well_df["Measurement"], fixed_init)
 
     return_dict = dict()
     return_dict["Rate"]  = opt_params[0]
     return_dict["Cap"]   = opt_params[1]
     return_dict["Floor"] = opt_params[2]
-    if fixed_init == None:
-        return_dict["Init"] = opt_params[3]
-    else:
-        return_dict["Init"] = fixed_init
+    return_dict["Init"]  = opt_params[3]
 
     # Calculate threshold time, if it is specified
     if growth_threshold:
-        raise NotImplementedError()
+        return_dict["Threshold Time (hr)"] = \
+            _growth_threshold_time(opt_params[0], opt_params[1], opt_params[3],
+                                   growth_threshold)
 
     # Add supplemental data.
     for column in well_df.columns.values:
@@ -661,13 +2904,19 @@ def summarize_growth(df, channel, fixed_init = None, growth_threshold = None,
             hours.
         * Optionally finds the time when the population crosses some fraction of
             maximum population. By default, does not calculate this -- set
-            the growth_threshold parameter to add this calculation.
+            the growth_threshold parameter to add this calculation. The time
+            is reported in hours, in a "Threshold Time (hr)" column, and is
+            negative for wells that start out above the threshold.
+
+    All wells are fit together, starting from initial guesses based on each
+    well's own data; any well that doesn't converge is refit on its own.
 
     Params:
         df -- A DataFrame of Biotek data with at least one channel of growth
                 data.
-        channel -- The name of the channel with growth data. Should be a channel
-                    with only one Gain, or this will do weird things.
+        channel -- The name of the channel with growth data. If the channel
+                    was read at more than one gain, each gain is fit
+                    separately.
         growth_threshold -- If set, determines the fraction of of total
                                 population to find the time of, i.e., if
                                 growth_threshold = 0.25, this function will
@@ -682,16 +2931,72 @@ def summarize_growth(df, channel, fixed_init = None, growth_threshold = None,
                 characteristics of one from the original dataframe.
     '''
     channel_df = df[df.Channel == channel]
+    cube = PlateCube.from_tidy(channel_df)
+    n_channels, n_wells, n_times = cube.shape
+    channel_idx, well_idx = np.nonzero(cube.mask.any(axis = 2))
+    times  = cube.hours[channel_idx, well_idx]
+    values = cube.data[channel_idx, well_idx]
+    mask   = cube.mask[channel_idx, well_idx]
+
+    if verbose:
+        print("Fitting %d wells" % len(well_idx))
+    params, converged = _fit_logistic_growth_batch(times, values, mask,
+                                                   fixed_init)
+    if verbose:
+        print("%d wells didn't converge; fitting them individually" \
+              % (~converged).sum())
+    for i in np.flatnonzero(~converged):
+        well = cube.well_info.Well.iloc[well_idx[i]]
+        if verbose:
+            print("Summarizing from well %s" % well)
+        try:
+            params[i] = _fit_logistic_growth(times[i][mask[i]],
+                                             values[i][mask[i]], fixed_init)
+        except (RuntimeError, TypeError, ValueError) as error:
+            warnings.warn("Couldn't fit growth curve for well %s: %s" \
+                          % (well, error))
+            params[i] = np.nan
+
+    summary_df = pd.DataFrame(params, columns = ["Rate", "Cap", "Floor",
+                                                 "Init"])
+    if growth_threshold:
+        summary_df["Threshold Time (hr)"] = \
+            _growth_threshold_time(params[:, 0], params[:, 1], params[:, 3],
+                                   growth_threshold)
+
+    # Add supplemental data.
+    info_df = pd.concat([cube.channel_info.iloc[channel_idx]\
+                             .reset_index(drop = True),
+                         cube.well_info.iloc[well_idx].reset_index(drop = True)],
+                        axis = 1)
+    info_cols = [c for c in channel_df.columns \
+                 if c in info_df.columns and c not in \
+                 ["Channel", "Gain", "Units", "Excitation", "Emission"]]
+    return pd.concat([summary_df, info_df[info_cols]], axis = 1)
 
-    # Split dataframe into a list of dataframes for individual wells.
-    well_dfs = [channel_df[channel_df.Well == w] \
-                for w in channel_df.Well.unique()]
-    measurement_summary_rows = \
-        list(map(lambda df: summarize_single_well_growth(df, growth_threshold,
-                                                         fixed_init, verbose),
-                 well_dfs))
-    return pd.DataFrame(measurement_summary_rows)
 
+def _window_summary(window_df, group_cols):
+    '''
+    Averages Measurement over each group of a DataFrame, copying the last
+    value of every other column. Helper for window_averages and
+    endpoint_averages.
+    '''
+    # Plain sums, rather than groupby's mean, so that overflowed (infinite)
+    # measurements give infinite averages rather than NaN.
+    grouped = window_df.groupby(group_cols, observed = True)
+    groups  = grouped.ngroup().to_numpy()
+    keep    = groups >= 0
+    groups  = groups[keep].astype(np.int64)
+    n_groups = grouped.ngroups
+    sums    = np.bincount(groups, minlength = n_groups,
+                          weights = window_df.Measurement.to_numpy(
+                                        dtype = float)[keep])
+    counts  = np.bincount(groups, minlength = n_groups)
+    means   = pd.Series(sums / counts, index = grouped.size().index)
+    averages_df = window_df.drop_duplicates(group_cols, keep = "last")\
+                           .set_index(group_cols)
+    averages_df["Measurement"] = means
+    return averages_df.sort_index().reset_index()
 
 def window_averages(df, start, end, units = "seconds",
                     grouping_variables = None):
@@ -717,51 +3022,30 @@ def window_averages(df, start, end, units = "seconds",
         group_cols += grouping_variables
 
     # Start by screening out everything outside the desired time window.
-    def pick_out_window(df):
-        # Find times within the given window.
-        if units.lower() == "index":
-            all_times = df["Time (sec)"].unique()
-            all_times.sort()
-            window_times = all_times[start:end+1]
-            window_df = df[df["Time (sec)"].isin(window_times)]
-        else:
-            if units.lower() == "seconds":
-                col = "Time (sec)"
-            elif units.lower() == "hours":
-                col = "Time (hr)"
-            else:
-                raise ValueError(('Unknown unit "{0}"; units must be ' \
-                                + '"seconds", "hours", or ' \
-                                + '"index"').format(units))
-            window_df = df[(df[col] >= start) & (df[col] <= end)]
-        return window_df
-
-    grouped_df = df.groupby(group_cols)
-    window_df = grouped_df.apply(pick_out_window)
-
-    # Figure out which columns are numeric and which have strings.
-    column_names = window_df.columns.values.tolist()
-    functions    = dict()
-    for col in column_names:
-        if col in group_cols:
-            continue
-        # Check to see if the column is numerically typed
-        if col == "Measurement":
-            #only average the measurement!! Why would you averaged
-            #anything else
-            #np.issubdtype(window_df[col].dtype, np.number):
-            # Numbers get averaged
-            functions[col] = np.average
+    if units.lower() == "index":
+        # Position of each time among its group's distinct times, and the
+        # window as a slice of those positions.
+        grouped_times = df.groupby(group_cols, observed = True)["Time (sec)"]
+        position = grouped_times.rank(method = "dense").to_numpy() - 1
+        n_times  = grouped_times.transform("nunique").to_numpy()
+        bounds = []
+        for bound in [start, end + 1]:
+            bound = np.where(bound < 0, bound + n_times, bound)
+            bounds.append(np.clip(bound, 0, n_times))
+        in_window = (position >= bounds[0]) & (position < bounds[1])
+    else:
+        if units.lower() == "seconds":
+            col = "Time (sec)"
+        elif units.lower() == "hours":
+            col = "Time (hr)"
         else:
-            # Non-numbers get a copy of the last value
-            functions[col] = lambda x:x.iloc[-1]
+            raise ValueError(('Unknown unit "{0}"; units must be ' \
+                            + '"seconds", "hours", or ' \
+                            + '"index"').format(units))
+        in_window = (df[col] >= start) & (df[col] <= end)
 
     # Calculate windowed average
-    averages_df = window_df.groupby(group_cols).agg(functions)
-
-    averages_df.reset_index(inplace = True)
-
-    return averages_df
+    return _window_summary(df[in_window], group_cols)
 
 
 def endpoint_averages(df, window_size = 10, grouping_variables = None):
@@ -770,7 +3054,8 @@ def endpoint_averages(df, window_size = 10, grouping_variables = None):
     average fluorescence.
 
     Params:
-        window_size - Averages are taken over the last window_size points.
+        window_size - Averages are taken over the last window_size points (or
+                        over every point, for wells with fewer points).
         grouping_variables - Optional list of column names on which to group.
                                 Use this option primarily to separate multiple
                                 plates' worth of data with overlapping wells.
@@ -778,18 +3063,31 @@ def endpoint_averages(df, window_size = 10, grouping_variables = None):
     group_cols = ["Channel", "Gain", "Well"]
     if grouping_variables:
         group_cols += grouping_variables
-    grouped_df = df.groupby(group_cols)
-    last_time_dfs = []
-    for name, group in grouped_df:
-        all_times = group["Time (hr)"].unique()
-        first_last_time = np.sort(all_times)[-window_size]
-        last_time_dfs.append(group[group["Time (hr)"] >= first_last_time])
-    end_time_dfs = pd.concat(last_time_dfs)
-    return window_averages(end_time_dfs, 0, window_size, "index",
-                           grouping_variables)
+    from_end = df.groupby(group_cols, observed = True)["Time (hr)"]\
+                 .rank(method = "dense", ascending = False)
+    end_time_df = df[from_end.to_numpy() <= window_size]
+    return _window_summary(end_time_df, ["Channel", "Gain", "Excitation",
+                                         "Emission", "Well"] \
+                                        + (grouping_variables or []))
+
 
+def _fit_splines(series, smoothing_factor, derivatives):
+    '''
+    Worker for spline_fit: fits a spline to each (times, values) pair in
+    series, returning a list of (fit, derivative) arrays evaluated at the
+    given times (derivative is None unless derivatives is True).
+    '''
+    results = []
+    for times, values in series:
+        spline = scipy.interpolate.UnivariateSpline(times, values,
+                                                    s = smoothing_factor)
+        results.append((spline(times),
+                        spline.derivative()(times) if derivatives else None))
+    return results
 
-def spline_fit(df, column = "Measurement", smoothing_factor = None):
+def spline_fit(df, column = "Measurement", smoothing_factor = None,
+               derivatives = False, grouping_variables = None,
+               workers = None, chunksize = 64):
     '''
     Adds a spline fit of the uM traces of a dataframe of the type made by
     tidy_biotek_data.
@@ -803,20 +3101,261 @@ def spline_fit(df, column = "Measurement", smoothing_factor = None):
                             smoothing factor produces tighter fit; 0 smoothing
                             factor interpolates every point. See parameter 's'
                             in scipy.interpolate.UnivariateSpline.
+        derivatives - If True, also adds a "spline derivative" column with the
+                        derivative of each spline (per second) at each
+                        measurement time. Default False.
+        grouping_variables - Optional list of column names on which to group.
+                                Use this option primarily to separate multiple
+                                plates' worth of data with overlapping wells.
+        workers - Number of worker processes to fit splines in. Default None,
+                    in which case splines are fit in this process.
+        chunksize - Number of series sent to a worker at a time. Default 64.
     Returns:
-        A DataFrame of df augmented with columns for a spline fit.
+        A DataFrame of df augmented with columns for a spline fit, with the
+        same rows and index as df.
     '''
+    group_cols = ["Channel", "Gain", "Excitation", "Emission", "Well"]
+    if grouping_variables:
+        group_cols += grouping_variables
+
+    # Pull out each series' times and values once, sorted by time.
+    groups = df.groupby(group_cols).ngroup().to_numpy()
+    times  = df["Time (sec)"].to_numpy(dtype = float)
+    values = df[column].to_numpy(dtype = float)
+    positions = np.flatnonzero(groups >= 0)
+    positions = positions[np.lexsort((times[positions], groups[positions]))]
+    bounds    = np.flatnonzero(np.diff(groups[positions])) + 1
+    series    = [(times[p], values[p]) for p in np.split(positions, bounds)] \
+                if len(positions) else []
+
     # Fit 3rd order spline
-    grouped_df = df.groupby(["Channel", "Gain", "Well"])
-    splined_df = pd.DataFrame()
-    for name, group in grouped_df:
-        spline = scipy.interpolate.UnivariateSpline(group["Time (sec)"],
-                                                    group[column],
-                                                    s = smoothing_factor)
-        group["spline fit"] = spline(group["Time (sec)"])
-        splined_df = splined_df.append(group)
+    chunks = [series[i:i + chunksize] for i in range(0, len(series),
+                                                     chunksize)]
+    if workers is None:
+        results = [_fit_splines(chunk, smoothing_factor, derivatives) \
+                   for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_fit_splines, chunk, smoothing_factor,
+                                       derivatives) \
+                       for chunk in chunks]
+            results = [future.result() for future in futures]
+    results = [r for chunk_results in results for r in chunk_results]
+
+    splined_df = df.copy()
+    fits = np.full(len(df), np.nan)
+    if results:
+        fits[positions] = np.concatenate([fit for fit, _ in results])
+    splined_df["spline fit"] = fits
+    if derivatives:
+        slopes = np.full(len(df), np.nan)
+        if results:
+            slopes[positions] = np.concatenate([d for _, d in results])
+        splined_df["spline derivative"] = slopes
     return splined_df
 
+def _series_matrix(df, column, grouping_variables = None):
+    '''
+    Packs one column of a tidy DataFrame into a (series x time) matrix, with one
+    row per channel/well combination (see PlateCube).
+
+    Returns: (values, rows, lengths), where values is a float matrix (NaN
+                padded), rows holds each entry's row position in df (-1 for
+                padding), and lengths is the number of timepoints in each
+                series. Each row is sorted by time.
+    '''
+    cube = PlateCube.from_tidy(df, column, grouping_variables)
+    n_series = cube.shape[0] * cube.shape[1]
+    values  = cube.data.reshape(n_series, cube.shape[2])
+    rows    = cube.rows.reshape(n_series, cube.shape[2])
+    lengths = cube.mask.reshape(n_series, cube.shape[2]).sum(axis = 1)
+    return values, rows, lengths
+
+def _frame_times(df, rows, time_column):
+    '''
+    Median time between frames (from the given time column) of each row of a
+    series matrix (see _series_matrix); NaN for series with only one frame.
+    '''
+    times = df[time_column].to_numpy(dtype = float)
+    times = np.where(rows >= 0, times[rows], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(np.diff(times, axis = 1), axis = 1)
+
+def _window_frames(df, rows, window_size, units):
+    '''
+    Converts a moving-average window size into an odd number of frames for
+    each row of a series matrix (see _series_matrix), using each series'
+    median time between frames if the window is given in time units.
+    '''
+    if units == "index":
+        n_frames = np.full(len(rows), window_size, dtype = np.int64)
+    else:
+        if units == "hours":
+            time_column = "Time (hr)"
+        elif units == "seconds":
+            time_column = "Time (sec)"
+        else:
+            raise ValueError(('Unknown unit "{0}"; units must be ' \
+                              + '"seconds", "hours", or ' \
+                              + '"index"').format(units))
+        # Time-per-frame can vary substantially between frames. We'll
+        # use the median time-difference as an estimate for
+        # the time-per-frame.
+        time_per_frame = _frame_times(df, rows, time_column)
+        n_frames = np.ceil(window_size / time_per_frame)
+        n_frames = np.where(np.isfinite(n_frames), n_frames, 1)\
+                     .astype(np.int64)
+    return n_frames + (n_frames % 2 == 0)
+
+def _moving_average_matrix(values, lengths, n_frames):
+    '''
+    Centered moving average of each row of a (series x time) matrix, over a
+    (per-row, odd) number of frames. Entries whose window would run off either
+    end of their series are left out.
+
+    Windows holding a NaN average to NaN, and windows holding infinities
+    average to that infinity (or NaN, for both signs), as np.mean would give.
+
+    Returns: (smoothed, valid), where valid marks which entries of smoothed
+                are averages of windows that fit in their series.
+    '''
+    n_series, n_times = values.shape
+    half  = (n_frames // 2)[:, None]
+    frame = np.arange(n_times)[None, :]
+    start = frame - half
+    end   = frame + half + 1
+    valid = (start >= 0) & (end <= lengths[:, None])
+    series = np.arange(n_series)[:, None]
+    start = np.clip(start, 0, n_times)
+    end   = np.clip(end, 0, n_times)
+
+    def window_sums(x):
+        # Window sums, as differences of a cumulative sum. Code taken from
+        # StackOverflow user Jamie.
+        sums = np.zeros((n_series, n_times + 1))
+        sums[:, 1:] = np.cumsum(x, axis = 1)
+        return sums[series, end] - sums[series, start]
+
+    # Non-finite values are left out of the sums and counted separately.
+    finite   = np.isfinite(values)
+    smoothed = window_sums(np.where(finite, values, 0)) / n_frames[:, None]
+    n_pos = window_sums(values == np.inf)
+    n_neg = window_sums(values == -np.inf)
+    n_nan = window_sums(np.isnan(values))
+    smoothed[n_pos > 0] = np.inf
+    smoothed[n_neg > 0] = -np.inf
+    smoothed[(n_nan > 0) | ((n_pos > 0) & (n_neg > 0))] = np.nan
+    return np.where(valid, smoothed, np.nan), valid
+
+def _gradient_matrix(values, times, lengths):
+    '''
+    Derivative of each row of a (series x time) matrix with respect to the
+    matching row of times, computed as np.gradient would for each row on its
+    own (second-order centered differences inside, first-order at the ends).
+    Each row's data must run contiguously from its first column for lengths
+    frames; rows with fewer than two frames come out NaN.
+    '''
+    n_series, n_times = values.shape
+    gradient = np.full(values.shape, np.nan)
+    if n_times < 2:
+        return gradient
+    series = np.arange(n_series)
+    with np.errstate(all = "ignore"):
+        dx = np.diff(times, axis = 1)
+        dx1, dx2 = dx[:, :-1], dx[:, 1:]
+        a = -dx2 / (dx1 * (dx1 + dx2))
+        b = (dx2 - dx1) / (dx1 * dx2)
+        c = dx1 / (dx2 * (dx1 + dx2))
+        gradient[:, 1:-1] = a * values[:, :-2] + b * values[:, 1:-1] \
+                            + c * values[:, 2:]
+        last = np.clip(lengths - 1, 1, n_times - 1)
+        gradient[:, 0] = (values[:, 1] - values[:, 0]) / dx[:, 0]
+        gradient[series, last] = (values[series, last] \
+                                  - values[series, last - 1]) \
+                                 / dx[series, last - 1]
+    gradient[np.arange(n_times)[None, :] >= lengths[:, None]] = np.nan
+    gradient[lengths < 2] = np.nan
+    return gradient
+
+def _savgol_matrix(values, lengths, n_frames, frame_times, polyorder):
+    '''
+    Savitzky-Golay smoothing and first derivative of each row of a (series x
+    time) matrix, with per-row (odd) window sizes. Edge frames are fit with a
+    polynomial over the first or last window, so nothing is clipped. Windows
+    are shrunk to fit short series.
+
+    Params:
+        values, lengths -- As returned by _series_matrix.
+        n_frames -- Window size, in frames, for each series.
+        frame_times -- Time between frames for each series, which sets the
+                        time units of the derivative.
+        polyorder -- Order of the fitted polynomial.
+    Returns: (smoothed, derivative) matrices, NaN where values is padding.
+    '''
+    smoothed   = np.full(values.shape, np.nan)
+    derivative = np.full(values.shape, np.nan)
+    windows = np.minimum(n_frames, lengths - (lengths % 2 == 0))
+    for length, window in set(zip(lengths.tolist(), windows.tolist())):
+        if length == 0:
+            continue
+        series = np.flatnonzero((lengths == length) & (windows == window))
+        order  = min(polyorder, window - 1)
+        block  = values[series, :length]
+        smoothed[series, :length] = scipy.signal.savgol_filter(
+                                        block, window, order, axis = 1,
+                                        mode = "interp")
+        derivative[series, :length] = scipy.signal.savgol_filter(
+                                        block, window, order, deriv = 1,
+                                        axis = 1, mode = "interp") \
+                                      / frame_times[series, None]
+    return smoothed, derivative
+
+def savgol_fit(df, column = "Measurement", window_size = 1, units = "hours",
+               grouping_variables = None, polyorder = 2):
+    '''
+    Smooths measurements (or values from some other column) with a
+    Savitzky-Golay filter, and finds their derivative with respect to time from
+    the same local polynomial fits. All wells and channels are filtered at
+    once, and unlike moving_average_fit, no frames are clipped from the ends of
+    each series.
+
+    The derivative assumes that measurements are evenly spaced in time; the
+    median time between frames in each series is used as the spacing.
+
+    Params:
+        df -- DataFrame of fluorescence data
+        column -- The column to smooth. Default "Measurement", which smooths OD
+                    and fluorescence data.
+        window_size -- Specifies the number of frames in each local fit. Can be
+                        in units of frames ("index") or time ("hours" or
+                        "seconds"). Window size will be rounded up to the
+                        nearest odd number, and shrunk for series too short to
+                        hold a whole window.
+        units -- Either "hours" (default), "seconds", or "index". If "seconds"
+                    or "hours", all measurements must be equally spaced in time.
+        grouping_variables - Optional list of column names on which to group.
+                                Use this option primarily to separate multiple
+                                plates' worth of data with overlapping wells.
+        polyorder -- Order of the polynomial fit in each window. Default 2.
+    Returns: A copy of df in which the column is replaced by its smoothed
+                version, with an added column "<column> Derivative" holding
+                the derivative with respect to time in seconds (in units of
+                <units>/sec).
+    '''
+    values, rows, lengths = _series_matrix(df, column, grouping_variables)
+    n_frames = _window_frames(df, rows, window_size, units)
+    frame_times = _frame_times(df, rows, "Time (sec)")
+    smoothed, derivative = _savgol_matrix(values, lengths, n_frames,
+                                          frame_times, polyorder)
+
+    keep  = rows >= 0
+    order = np.argsort(rows[keep], kind = "stable")
+    smoothed_df = df.iloc[rows[keep][order]].copy()
+    smoothed_df[column] = smoothed[keep][order]
+    smoothed_df["%s Derivative" % column] = derivative[keep][order]
+    return smoothed_df
+
 def moving_average_fit(df, column = "Measurement", window_size = 1,
                        units = "hours", grouping_variables = None):
     '''
@@ -831,10 +3370,8 @@ def moving_average_fit(df, column = "Measurement", window_size = 1,
     Note that smoothing will clip floor(n/2) frames from each end of the data,
     where n is the size of the moving average window in frames.
 
-    Assumes that any data outside of the column to be smoothed is identical
-    across time within each well. If this is not true for some column, then the
-    values of that column will be overwritten by the value for the earliest
-    value of that column in that well.
+    All wells and channels are smoothed at once, as rows of a single (series x
+    time) matrix; series of different lengths are padded out and masked.
 
     Params:
         df -- DataFrame of fluorescence data
@@ -850,51 +3387,23 @@ def moving_average_fit(df, column = "Measurement", window_size = 1,
                                 Use this option primarily to separate multiple
                                 plates' worth of data with overlapping wells.
     Returns: A DataFrame in which measurements (or some other column) are
-                replaced by a moving average of those measurements.
+                replaced by a moving average of those measurements. Rows keep
+                their order and index from df.
     '''
-    group_cols = ["Channel", "Gain","Excitation","Emission", "Well"]
-    if grouping_variables:
-        group_cols += grouping_variables
-    grouped_df = df.groupby(group_cols)
-    smoothed_groups = []
-    for name, group in grouped_df:
-        group.sort_values("Time (sec)", ascending = True, inplace = True)
-
-        # Figure out the window size, in frames.
-        if units == "index":
-            n_frames = window_size
-        else:
-            if units == "hours":
-                times = group["Time (hr)"]
-            elif units == "seconds":
-                times = group["Time (sec)"]
-            # Time-per-frame can vary substantially between frames. We'll
-            # use the median time-difference as an estimate for
-            # the time-per-frame.
-            time_per_frame = np.median(np.diff(times))
-            n_frames = math.ceil(window_size / time_per_frame)
-        if n_frames%2 == 0:
-            n_frames += 1
-
-        # Calculate smoothed data. Code taken from StackOverflow user Jamie.
-        column_data = group[column].to_numpy()
-        smoothed_data = np.cumsum(column_data)
-        smoothed_data[n_frames:] = \
-                            smoothed_data[n_frames:] - smoothed_data[:-n_frames]
-        smoothed_data = smoothed_data[n_frames - 1:] / n_frames
-
-        # Clip out data from either end of the group and replace the column of
-        # interest with the smoothed version.
-        group = group.iloc[n_frames//2 - 1 : -n_frames//2]
-        group[column] = smoothed_data
-
-        # This will get concatenated into a total dataframe later.
-        smoothed_groups.append(group)
-    return pd.concat(smoothed_groups)
+    values, rows, lengths = _series_matrix(df, column, grouping_variables)
+    n_frames = _window_frames(df, rows, window_size, units)
+    smoothed, valid = _moving_average_matrix(values, lengths, n_frames)
+
+    # Scatter the smoothed values back onto the rows they came from.
+    order = np.argsort(rows[valid], kind = "stable")
+    smoothed_df = df.iloc[rows[valid][order]].copy()
+    smoothed_df[column] = smoothed[valid][order]
+    return smoothed_df
 
 
 def smoothed_derivatives(df, column = "Measurement", window_size = 1,
-                         units = "hours", grouping_variables = None):
+                         units = "hours", grouping_variables = None,
+                         method = "moving_average", polyorder = 2):
     '''
     Calculates a smoothed derivative of the time traces in a dataframe. Returns
     a new DataFrame with the measurements in a column replaced by a derivative
@@ -912,43 +3421,85 @@ def smoothed_derivatives(df, column = "Measurement", window_size = 1,
         grouping_variables - Optional list of column names on which to group.
                                 Use this option primarily to separate multiple
                                 plates' worth of data with overlapping wells.
+        method - How to smooth: "moving_average" (default) takes the gradient
+                    of a moving average (see moving_average_fit), and "savgol"
+                    takes the derivative of Savitzky-Golay fits (see
+                    savgol_fit), which doesn't clip any frames.
+        polyorder - Order of the polynomial fits, for the "savgol" method.
+                    Default 2.
     Returns:
-        A DataFrame of df augmented with columns for a spline fit and a
-        derivative
+        A DataFrame of df in which the column is replaced by its smoothed
+        derivative with respect to time (in seconds), clipped as in
+        moving_average_fit for the "moving_average" method. If column is
+        "Measurement", units become "Measurement (<units>/sec)".
     '''
-    smoothed_df = moving_average_fit(df, column, window_size = window_size,
-                             units = units,
-                             grouping_variables = grouping_variables)
-    group_cols = ["Channel", "Gain","Excitation","Emission", "Well"]
-    if grouping_variables:
-        group_cols += grouping_variables
-    grouped_df = smoothed_df.groupby(group_cols)
-    deriv_df   = pd.DataFrame()
-    for name, group in grouped_df:
+    if not method in ["moving_average", "savgol"]:
+        raise ValueError(('Unknown method "{0}"; method must be ' \
+                          + '"moving_average" or "savgol"').format(method))
+    if method == "savgol":
+        deriv_name = "%s Derivative" % column
+        deriv_df = savgol_fit(df, column, window_size, units,
+                              grouping_variables, polyorder)
+        deriv_df[column] = deriv_df.pop(deriv_name)
         if column == "Measurement":
-            deriv_name = "%s (%s/sec)" % (column, group.Units.unique()[0])
-            group.Units = deriv_name
-        group[column] = np.gradient(group[column].to_numpy(),
-                                        group["Time (sec)"].to_numpy())
-        deriv_df = deriv_df.append(group)
+            deriv_df["Units"] = "%s (" % column \
+                                + deriv_df.Units.astype(str) + "/sec)"
+        return deriv_df
+
+    values, rows, lengths = _series_matrix(df, column, grouping_variables)
+    n_frames = _window_frames(df, rows, window_size, units)
+    smoothed, valid = _moving_average_matrix(values, lengths, n_frames)
+
+    # Shift each series' smoothed frames to start at the first column, then
+    # differentiate every series at once.
+    half  = (n_frames // 2)[:, None]
+    shift = np.clip(np.arange(values.shape[1])[None, :] + half, 0,
+                    values.shape[1] - 1)
+    smoothed = np.take_along_axis(smoothed, shift, axis = 1)
+    rows     = np.where(np.take_along_axis(valid, shift, axis = 1),
+                        np.take_along_axis(rows, shift, axis = 1), -1)
+    times    = df["Time (sec)"].to_numpy(dtype = float)
+    times    = np.where(rows >= 0, times[rows], np.nan)
+    n_valid  = valid.sum(axis = 1)
+    gradient = _gradient_matrix(smoothed, times, n_valid)
+
+    keep  = rows >= 0
+    order = np.argsort(rows[keep], kind = "stable")
+    deriv_df = df.iloc[rows[keep][order]].copy()
+    deriv_df[column] = gradient[keep][order]
+    if column == "Measurement":
+        deriv_df["Units"] = "%s (" % column + deriv_df.Units.astype(str) \
+                            + "/sec)"
     return deriv_df
 
 
-def normalize(df, norm_channel = "OD600", norm_channel_gain = -1):
+def normalize(df, norm_channel = "OD600", norm_channel_gain = -1,
+              grouping_variables = None):
     '''
     Normalize expression measurements by dividing each measurement by the value
     of a reference channel at that time (default OD600).
 
+    Each measurement is divided by the reference channel measurement from the
+    same well and the same read cycle: the reference reading closest in time,
+    once the usual delay between reading the reference channel and the
+    measurement's channel within a cycle is allowed for. Measurements with no
+    reference reading within half a read interval of that (e.g., because a
+    reference reading is missing) become NaN, with a warning.
+
     Args:
         df - DataFrame of time traces, of the kind produced by tidy_biotek_data.
         norm_channel - Name of a channel to normalize by. Default "OD600"
         norm_channel_gain - Gain of the channel you want to normalize by.
                             Default -1 (for OD600).
+        grouping_variables - Optional list of column names on which to group.
+                                Use this option primarily to separate multiple
+                                plates' worth of data with overlapping wells.
     Returns:
-        A DataFrame of df augmented with columns for normalized AFU/uM
-        ("Normalized Measurement"). Will have units of
+        A copy of df in which every measurement outside the normalization
+        channel is divided by the normalization channel. Will have units of
         "<measurement units>/<normalization units>", or "<measurement units>/OD"
-        if normalizing with an OD.
+        if normalizing with an OD. Measurements from the normalization channel
+        itself are left as they are.
     '''
     # Do some kind of check to make sure the norm channel exists with the given
     # channel...
@@ -959,27 +3510,89 @@ def normalize(df, norm_channel = "OD600", norm_channel_gain = -1):
         raise ValueError("Channel %s does not use gain %d." % \
                          (norm_channel, norm_channel_gain))
 
-    # Iterate over channels/gains, applying normalization
-    OD_channel_string = df[(df.Channel == norm_channel) & \
-                 (df.Gain== norm_channel_gain)].ChanStr.unique()[0]
-    od_df = df[df.ChanStr == OD_channel_string].reset_index()
-    #dflst = []
-    channel_list = df.ChanStr.unique().tolist()
-    del channel_list[channel_list.index(OD_channel_string)]
-    dflist = [df[df.ChanStr == a].reset_index() for a in channel_list]
-    normalized_df = od_df.copy()
-    for channel_df in dflist:
-        channel_df.Measurement = channel_df.Measurement/od_df.Measurement
-        orig_units = channel_df.Units.unique()[0]
-        norm_units = "OD" if norm_channel.startswith("OD") \
-                          else norm_data.Units.unique()[0]
-        channel_df.Units = "%s/%s" % (orig_units, norm_units)
-        normalized_df = normalized_df.append(channel_df,ignore_index=True)
-    normalized_df.reset_index()
-
+    keys = ["Well"]
+    if grouping_variables:
+        keys += grouping_variables
+    norm_rows = ((df.Channel == norm_channel) \
+                 & (df.Gain == norm_channel_gain)).to_numpy()
+    norm_chan_str = df.ChanStr[norm_rows].iloc[0]
+    norm_rows &= (df.ChanStr == norm_chan_str).to_numpy()
+
+    # Each channel is read a roughly fixed time after (or before) the
+    # normalization channel in every cycle. Estimate that lag from when each
+    # channel's series starts, taking the median over wells.
+    times = df["Time (sec)"].to_numpy(dtype = float)
+    match_df = df[keys].astype(object).assign(ChanStr = df.ChanStr.to_numpy(),
+                                              Time = times)
+    firsts = match_df.groupby(keys + ["ChanStr"], sort = False).Time.min()\
+                     .reset_index()
+    norm_firsts = firsts[firsts.ChanStr == norm_chan_str]\
+                      .drop("ChanStr", axis = 1).rename(columns = \
+                                                        {"Time": "NormTime"})
+    firsts = firsts.merge(norm_firsts, on = keys)
+    lags = (firsts.Time - firsts.NormTime).groupby(firsts.ChanStr).median()
+    match_df["Time"] = times - match_df.ChanStr.map(lags).fillna(0)\
+                                  .to_numpy(dtype = float)
+
+    # Readings more than half a read interval from any reference reading have
+    # no match.
+    norm_df = match_df[norm_rows].drop("ChanStr", axis = 1)\
+                                 .assign(Norm = df.Measurement[norm_rows]\
+                                                  .to_numpy(dtype = float))
+    norm_df = norm_df.sort_values(keys + ["Time"], kind = "mergesort")
+    intervals = norm_df.groupby(keys, sort = False).Time.diff()
+    interval  = intervals[intervals > 0].median()
+    tolerance = interval / 2 if interval == interval else None
+
+    # Match every measurement to the closest normalization measurement, in
+    # one merge.
+    match_df = match_df.drop("ChanStr", axis = 1)\
+                       .assign(Row = np.arange(len(df)))\
+                       .sort_values("Time", kind = "mergesort")
+    matched = pd.merge_asof(match_df, norm_df.sort_values("Time",
+                                                          kind = "mergesort"),
+                            on = "Time", by = keys, direction = "nearest",
+                            tolerance = tolerance)
+    norms = np.full(len(df), np.nan)
+    norms[matched.Row.to_numpy()] = matched.Norm.to_numpy(dtype = float)
+
+    other_rows = ~norm_rows
+    unmatched  = other_rows & np.isnan(norms)
+    if unmatched.any():
+        warnings.warn(("%d measurement(s) have no matching %s measurement; " \
+                       + "setting them to NaN.") % (unmatched.sum(),
+                                                    norm_chan_str))
+
+    norm_units = "OD" if norm_channel.startswith("OD") \
+                      else df.Units[norm_rows].iloc[0]
+    normalized_df = df.copy()
+    measurements = df.Measurement.to_numpy(dtype = float)
+    normalized_df["Measurement"] = np.where(other_rows, measurements / norms,
+                                            measurements)
+    units = df.Units.astype(str)
+    normalized_df["Units"] = units.where(norm_rows,
+                                         units + "/%s" % norm_units)
     return normalized_df
 
-def apply_by_well(df, summary_function, split_channels = True):
+def _apply_to_chunk(summary_function, chunk):
+    '''
+    Worker for apply_by_well: rebuilds each well's DataFrame from the arrays
+    it was shipped as and applies summary_function to it. Returns a list of
+    (result, exception) pairs, one per well, with exception None on success.
+    '''
+    results = []
+    for index, columns in chunk:
+        try:
+            well_df = pd.DataFrame(columns, index = index)
+            results.append((summary_function(well_df), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def apply_by_well(df, summary_function, split_channels = True,
+                  executor = None, workers = None, chunksize = 1,
+                  errors = "raise"):
     # README:
     # May be able to rewrite a bunch of other functions using this!!!!!
     '''
@@ -988,6 +3601,12 @@ def apply_by_well(df, summary_function, split_channels = True):
     The summary function should be a function that takes one well's worth of
     data and returns a list representing a new row in the summarized DataFrame.
 
+    The summary function can be run in parallel by passing an executor or a
+    number of worker processes. In that case each well's data is sent to the
+    workers as plain column arrays and rebuilt into a DataFrame there, and the
+    summary function must be picklable (i.e., defined at the top level of a
+    module, not a lambda). Results come back in the same order either way.
+
     Args:
         df - The dataframe to be summarized.
         summary_function - A function that summarizes data from a single well,
@@ -1003,23 +3622,82 @@ def apply_by_well(df, summary_function, split_channels = True):
                             ALL of the channels for each well (for example,
                             when normalizing measurements against OD). Default
                             True.
+        executor - A concurrent.futures Executor to run the summary function
+                    on. Default None. The executor is not shut down
+                    afterwards.
+        workers - If executor is None, the number of worker processes to run
+                    the summary function in. Default None, in which case the
+                    summary function is run in this process, one well at a
+                    time.
+        chunksize - Number of wells sent to a worker at a time. Larger chunks
+                        cut down on communication overhead when the summary
+                        function is fast. Default 1.
+        errors - What to do if the summary function fails on a well. If
+                    "raise" (default), raises the first error encountered. If
+                    "warn", issues a warning naming the well and the problem,
+                    and leaves that well out of the results.
     '''
-    wells = df.Well.unique()
-    if split_channels:
-        channels = df.Channel.unique()
-        gains    = df.Gain.unique()
-    else:
-        channels = [None]
-        gains    = [None]
+    if not errors in ["warn", "raise"]:
+        raise ValueError(('Unknown error handling "{0}"; errors must be ' \
+                          + '"warn" or "raise"').format(errors))
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1; got %s" % chunksize)
 
     groups = ["Well"]
     if split_channels:
         groups.append("Channel")
         groups.append("Gain")
     grouped_df = df.groupby(groups)
+
+    if executor is None and workers is None:
+        names   = []
+        results = []
+        for name, group in grouped_df:
+            names.append(name)
+            try:
+                results.append((summary_function(group), None))
+            except Exception as e:
+                if errors == "raise":
+                    raise
+                results.append((None, e))
+    else:
+        # Split the data into per-well arrays, in group order.
+        group_idx = grouped_df.ngroup().to_numpy()
+        positions = np.flatnonzero(group_idx >= 0)
+        positions = positions[np.argsort(group_idx[positions],
+                                         kind = "stable")]
+        bounds    = np.flatnonzero(np.diff(group_idx[positions])) + 1
+        well_positions = np.split(positions, bounds) if len(positions) else []
+        names     = list(grouped_df.groups.keys())
+        index     = df.index.to_numpy()
+        columns   = {c: df[c].values for c in df.columns}
+        tasks     = [(index[p], {c: v[p] for c, v in columns.items()}) \
+                     for p in well_positions]
+        chunks    = [tasks[i:i + chunksize] \
+                     for i in range(0, len(tasks), chunksize)]
+
+        own_executor = executor is None
+        if own_executor:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        try:
+            futures = [executor.submit(_apply_to_chunk, summary_function,
+                                       chunk) \
+                       for chunk in chunks]
+            results = [r for future in futures for r in future.result()]
+        finally:
+            if own_executor:
+                executor.shutdown()
+
     summarized_list = []
-    for name, group in grouped_df:
-        summarized_list.append(summary_function(group))
+    for name, (result, error) in zip(names, results):
+        if error is None:
+            summarized_list.append(result)
+        elif errors == "raise":
+            raise error
+        else:
+            warnings.warn("Couldn't apply %s to well %s: %s" \
+                          % (getattr(summary_function, "__name__",
+                                     summary_function), name, error))
     return pd.DataFrame(summarized_list)
 
 
@@ -0,0 +1,391 @@
+import os
+import concurrent.futures
+import pytest
+import numpy as np
+import pandas as pd
+
+import murraylab_tools.biotek as mt_biotek
+
+def well_max(well_df):
+    if well_df.Well.iloc[0] == "A3":
+        raise ValueError("Bad well")
+    return [well_df.Well.iloc[0], well_df.ChanStr.iloc[0],
+            well_df.Measurement.max(), well_df.index[0]]
+
+class TestAnalysis():
+
+    test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+    df = mt_biotek.tidy_biotek_df(os.path.join(test_dir, "small_plate.csv"),
+                    os.path.join(test_dir, "small_plate_supplementary.csv"),
+                    volume = 10.0)
+
+    def test_background_subtract(self):
+        '''
+        Checks background subtraction against a direct per-timepoint average of
+        the negative controls.
+        '''
+        controls = ["A1", "A2"]
+        bg_df = mt_biotek.background_subtract(self.df, controls)
+        assert bg_df.index.equals(self.df.index)
+        for _, row in self.df.sample(10, random_state = 0).iterrows():
+            ctrl = self.df[self.df.Well.isin(controls) \
+                           & (self.df.ChanStr == row.ChanStr) \
+                           & (self.df["Time (sec)"] == row["Time (sec)"])]
+            expected = row.Measurement - ctrl.Measurement.mean()
+            assert bg_df.Measurement[row.name] == pytest.approx(expected)
+
+    def test_background_subtract_missing(self):
+        '''
+        Checks handling of measurements without a matching negative control.
+        '''
+        df = self.df[~((self.df.Well == "A1") & \
+                       (self.df["Time (sec)"] == self.df["Time (sec)"].max()))]
+        with pytest.raises(ValueError):
+            mt_biotek.background_subtract(df, "A1")
+        nan_df = mt_biotek.background_subtract(df, "A1",
+                                               missing_background = "nan")
+        late = df["Time (sec)"] == df["Time (sec)"].max()
+        assert nan_df.Measurement[late].isnull().all()
+        drop_df = mt_biotek.background_subtract(df, "A1",
+                                                missing_background = "drop")
+        assert len(drop_df) == (~late).sum()
+        # Averaging over two controls covers the gap.
+        both_df = mt_biotek.background_subtract(df, ["A1", "A2"])
+        assert not both_df.Measurement.isnull().any()
+
+    def growth_df(self, params):
+        '''
+        Builds a tidy OD600 DataFrame with one well per set of logistic growth
+        parameters.
+        '''
+        times = np.arange(0, 20 * 3600, 600)
+        rng = np.random.RandomState(0)
+        rows = []
+        for i, p in enumerate(params):
+            od = mt_biotek.logistic_growth(times / 3600.0, *p) \
+                 + rng.normal(0, 0.002, len(times))
+            rows.append(pd.DataFrame({"Channel": "OD600", "Gain": -1,
+                                      "Time (sec)": times,
+                                      "Time (hr)": times / 3600.0,
+                                      "Well": "A%d" % (i + 1),
+                                      "Measurement": od,
+                                      "Units": "AFU", "Excitation": 600,
+                                      "Emission": -1, "Strain": "s%d" % i}))
+        return pd.concat(rows, ignore_index = True)
+
+    def test_summarize_growth(self):
+        '''
+        Checks that summarize_growth recovers growth parameters and threshold
+        times.
+        '''
+        params = [(0.8, 0.6, 0.09, 0.01), (1.5, 1.0, 0.05, 0.002),
+                  (0.4, 0.3, 0.1, 0.02)]
+        df = self.growth_df(params)
+        # Drop a few late points from one well.
+        df = df[~((df.Well == "A2") & (df["Time (hr)"] > 18))]
+        summary = mt_biotek.summarize_growth(df, "OD600",
+                                             growth_threshold = 0.5)
+        assert summary.Well.tolist() == ["A1", "A2", "A3"]
+        assert summary.Strain.tolist() == ["s0", "s1", "s2"]
+        for (_, row), p in zip(summary.iterrows(), params):
+            assert row.Rate  == pytest.approx(p[0], rel = 0.05)
+            assert row.Cap   == pytest.approx(p[1], rel = 0.05)
+            assert row.Floor == pytest.approx(p[2], abs = 0.01)
+            # Half-grown when init * exp(rate * t) grows to cap - init.
+            half_time = np.log((row.Cap - row.Init) / row.Init) / row.Rate
+            assert row["Threshold Time (hr)"] == pytest.approx(half_time)
+
+        single = mt_biotek.biotek.summarize_single_well_growth(
+                                                 df[df.Well == "A1"],
+                                                 growth_threshold = 0.5)
+        for col in ["Rate", "Cap", "Floor", "Init", "Threshold Time (hr)"]:
+            assert single[col] == pytest.approx(summary[col][0], rel = 1e-3)
+
+    def test_summarize_growth_fixed_init(self):
+        '''
+        Checks that a fixed initial population is respected.
+        '''
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01)])
+        summary = mt_biotek.summarize_growth(df, "OD600", fixed_init = 0.01)
+        assert summary.Init[0] == 0.01
+        assert summary.Rate[0] == pytest.approx(0.8, rel = 0.05)
+
+    def test_apply_by_well_parallel(self):
+        '''
+        Checks that apply_by_well gives the same results, in the same order, in
+        parallel as in series.
+        '''
+        df = self.df[self.df.Well != "A3"]
+        serial = mt_biotek.apply_by_well(df, well_max)
+        assert len(serial) == 5 * 3
+        pooled = mt_biotek.apply_by_well(df, well_max, workers = 2,
+                                         chunksize = 4)
+        pd.testing.assert_frame_equal(serial, pooled)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            threaded = mt_biotek.apply_by_well(df, well_max,
+                                               executor = executor,
+                                               split_channels = False)
+        assert threaded[0].tolist() == ["A1", "A2", "A4", "A5", "A6"]
+
+    def test_apply_by_well_errors(self):
+        '''
+        Checks that errors in the summary function are raised or reported per
+        well.
+        '''
+        for workers in [None, 2]:
+            with pytest.raises(ValueError):
+                mt_biotek.apply_by_well(self.df, well_max, workers = workers)
+            with pytest.warns(UserWarning, match = "A3"):
+                summary = mt_biotek.apply_by_well(self.df, well_max,
+                                                  workers = workers,
+                                                  errors = "warn")
+            assert len(summary) == 5 * 3
+            assert not (summary[0] == "A3").any()
+
+    def test_moving_average_fit(self):
+        '''
+        Checks moving averages against a direct convolution of each series,
+        including series of different lengths.
+        '''
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01), (1.5, 1.0, 0.05, 0.002)])
+        df = df[~((df.Well == "A2") & (df["Time (hr)"] > 15))]
+        smoothed = mt_biotek.moving_average_fit(df, window_size = 4,
+                                                units = "index")
+        assert smoothed.index.is_monotonic_increasing
+        for well, well_df in df.groupby("Well"):
+            expected = np.convolve(well_df.Measurement, np.ones(5) / 5,
+                                   mode = "valid")
+            well_smoothed = smoothed[smoothed.Well == well]
+            assert np.allclose(well_smoothed.Measurement, expected)
+            # Averages line up with the middle of their windows.
+            assert well_smoothed["Time (sec)"].tolist() == \
+                   well_df["Time (sec)"].iloc[2:-2].tolist()
+
+        # Windows in time units: 10-minute frames, so 1 hour is 7 frames.
+        by_hours = mt_biotek.moving_average_fit(df, window_size = 1)
+        by_index = mt_biotek.moving_average_fit(df, window_size = 7,
+                                                units = "index")
+        pd.testing.assert_frame_equal(by_hours, by_index)
+        with pytest.raises(ValueError):
+            mt_biotek.moving_average_fit(df, units = "days")
+
+    def test_moving_average_non_finite(self):
+        '''
+        Checks that windows holding a NaN reading (e.g. an unmatched
+        normalized measurement) or an overflowed reading average to NaN or
+        inf, without disturbing other windows.
+        '''
+        od_a2 = self.df[(self.df.Channel == "OD600") & (self.df.Well == "A2")]
+        with pytest.warns(UserWarning):
+            norm_df = mt_biotek.normalize(self.df.drop(od_a2.index[1]))
+        smoothed = mt_biotek.moving_average_fit(norm_df, window_size = 3,
+                                                units = "index")
+        gfp = smoothed[(smoothed.Gain == 61) & (smoothed.Well == "A2")]
+        assert gfp.Measurement.isnull().all()
+
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01)])
+        values = df.Measurement.to_numpy().copy()
+        values[5]  = np.nan
+        values[12] = np.inf
+        df["Measurement"] = values
+        smoothed = mt_biotek.moving_average_fit(df, window_size = 3,
+                                                units = "index")
+        expected = [np.mean(values[i:i + 3]) for i in range(len(values) - 2)]
+        assert np.allclose(smoothed.Measurement, expected, equal_nan = True)
+        assert np.isnan(smoothed.Measurement.iloc[3:6]).all()
+        assert np.isinf(smoothed.Measurement.iloc[10:13]).all()
+
+    def test_smoothed_derivatives(self):
+        '''
+        Checks smoothed derivatives against np.gradient of each smoothed
+        series.
+        '''
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01), (1.5, 1.0, 0.05, 0.002)])
+        df = df[~((df.Well == "A2") & (df["Time (hr)"] > 15))]
+        smoothed = mt_biotek.moving_average_fit(df, window_size = 1)
+        derivs = mt_biotek.smoothed_derivatives(df, window_size = 1)
+        assert derivs.index.equals(smoothed.index)
+        assert (derivs.Units == "Measurement (AFU/sec)").all()
+        for well, well_df in smoothed.groupby("Well"):
+            expected = np.gradient(well_df.Measurement.to_numpy(),
+                                   well_df["Time (sec)"].to_numpy())
+            assert np.allclose(derivs[derivs.Well == well].Measurement,
+                               expected)
+
+    def test_savgol_fit(self):
+        '''
+        Checks that Savitzky-Golay fits reproduce quadratics and their
+        derivatives exactly, edges included.
+        '''
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01), (1.5, 1.0, 0.05, 0.002)])
+        df = df[~((df.Well == "A2") & (df["Time (hr)"] > 15))].copy()
+        hours = df["Time (hr)"]
+        df["Measurement"] = np.where(df.Well == "A1", 1 + 2 * hours**2,
+                                     3 - hours)
+        fit_df = mt_biotek.savgol_fit(df, window_size = 1)
+        assert fit_df.index.equals(df.index)
+        assert np.allclose(fit_df.Measurement, df.Measurement)
+        expected = np.where(df.Well == "A1", 4 * hours, -1) / 3600.0
+        assert np.allclose(fit_df["Measurement Derivative"], expected)
+
+        derivs = mt_biotek.smoothed_derivatives(df, window_size = 1,
+                                                method = "savgol")
+        assert np.allclose(derivs.Measurement, expected)
+        assert (derivs.Units == "Measurement (AFU/sec)").all()
+        with pytest.raises(ValueError):
+            mt_biotek.smoothed_derivatives(df, method = "spline")
+
+    def test_extract_trajectories_only(self):
+        '''
+        Checks that trajectories are widened to one column per reading, with
+        multiple gains split out by ChanStr.
+        '''
+        traj_df = mt_biotek.extract_trajectories_only(self.df)
+        gfp_strs = self.df[self.df.Channel == "deGFP"].ChanStr.unique().tolist()
+        assert traj_df.columns.tolist() == ["Time", "Well", "OD600"] + gfp_strs
+        assert len(traj_df) == 6 * 4
+        a2 = self.df[self.df.Well == "A2"]
+        a2_traj = traj_df[traj_df.Well == "A2"]
+        for chan_str in gfp_strs:
+            assert np.all(a2_traj[chan_str].to_numpy() == \
+                          a2[a2.ChanStr == chan_str].Measurement.to_numpy())
+        assert np.all(a2_traj.Time.to_numpy() == \
+                      a2[a2.Channel == "OD600"]["Time (hr)"].to_numpy())
+
+    def test_extract_trajectories_misaligned(self):
+        '''
+        Checks that series of different lengths raise a ValueError.
+        '''
+        df = self.df.drop(self.df[(self.df.Well == "A4") \
+                                  & (self.df.Channel == "OD600")].index[-1])
+        with pytest.raises(ValueError, match = "1 well"):
+            mt_biotek.extract_trajectories_only(df)
+
+    def test_normalize(self):
+        '''
+        Checks normalization by OD and by a fluorescence channel.
+        '''
+        norm_df = mt_biotek.normalize(self.df)
+        assert norm_df.index.equals(self.df.index)
+        gfp = self.df[(self.df.Channel == "deGFP") & (self.df.Gain == 61)]
+        od  = self.df[self.df.Channel == "OD600"]
+        for well in ["A1", "A5"]:
+            expected = gfp[gfp.Well == well].Measurement.to_numpy() \
+                       / od[od.Well == well].Measurement.to_numpy()
+            normed = norm_df.loc[gfp[gfp.Well == well].index]
+            assert np.allclose(normed.Measurement, expected)
+            assert (normed.Units == "AFU/OD").all()
+        assert norm_df.loc[od.index].equals(od)
+
+        by_gfp = mt_biotek.normalize(self.df, "deGFP", 100)
+        od_units = by_gfp.loc[od.index].Units.unique().tolist()
+        assert od_units == ["absorbance/AFU"]
+
+    def test_normalize_unmatched(self):
+        '''
+        Checks that measurements without a normalization measurement become
+        NaN, with a warning.
+        '''
+        od_a2 = self.df[(self.df.Channel == "OD600") & (self.df.Well == "A2")]
+        df = self.df.drop(od_a2.index[-1])
+        with pytest.warns(UserWarning, match = "2 measurement"):
+            norm_df = mt_biotek.normalize(df)
+        assert norm_df.Measurement.isnull().sum() == 2
+
+    def test_normalize_missing_mid_series(self):
+        '''
+        Checks that a missing normalization reading partway through a series
+        only affects measurements from that read cycle.
+        '''
+        od_a2 = self.df[(self.df.Channel == "OD600") & (self.df.Well == "A2")]
+        df = self.df.drop(od_a2.index[1])
+        with pytest.warns(UserWarning, match = "2 measurement"):
+            norm_df = mt_biotek.normalize(df)
+        gfp_a2 = self.df[(self.df.Channel == "deGFP") & (self.df.Well == "A2")]
+        for gain in [61, 100]:
+            gfp = gfp_a2[gfp_a2.Gain == gain]
+            normed = norm_df.loc[gfp.index].Measurement.to_numpy()
+            expected = gfp.Measurement.to_numpy() \
+                       / od_a2.Measurement.to_numpy()
+            assert np.isnan(normed[1])
+            assert np.allclose(np.delete(normed, 1), np.delete(expected, 1))
+        assert norm_df.Measurement.isnull().sum() == 2
+
+    def test_window_averages(self):
+        '''
+        Checks window averages by index and by time against direct averages.
+        '''
+        a4_gfp = self.df[(self.df.Well == "A4") & (self.df.Gain == 100)]
+        for start, end, units, frames in [(1, 2, "index", [1, 2]),
+                                          (-3, -2, "index", [1, 2]),
+                                          (0, 0.2, "hours", None)]:
+            avg_df = mt_biotek.window_averages(self.df, start, end, units)
+            assert len(avg_df) == 6 * 3
+            if frames is None:
+                in_window = a4_gfp[a4_gfp["Time (hr)"] <= 0.2]
+            else:
+                in_window = a4_gfp.iloc[frames]
+            row = avg_df[(avg_df.Well == "A4") & (avg_df.Gain == 100)]
+            assert row.Measurement.iloc[0] == \
+                   pytest.approx(in_window.Measurement.mean())
+            assert row["Time (sec)"].iloc[0] == \
+                   in_window["Time (sec)"].iloc[-1]
+            assert row.Construct.iloc[0] == a4_gfp.Construct.iloc[0]
+        with pytest.raises(ValueError):
+            mt_biotek.window_averages(self.df, 0, 1, "days")
+
+    def test_window_averages_categorical(self):
+        '''
+        Checks that window and endpoint averages work on data with
+        categorical columns, as read back by read_tidy_biotek_data.
+        '''
+        tidy_filename = os.path.join(self.test_dir, "small_plate_uM_tidy.csv")
+        df = mt_biotek.read_tidy_biotek_data(tidy_filename)
+        compact_df = mt_biotek.read_tidy_biotek_data(tidy_filename,
+                                                     compact = True)
+        assert compact_df.Well.dtype.name == "category"
+        for average in [lambda d: mt_biotek.window_averages(d, 1, 2, "index"),
+                        lambda d: mt_biotek.window_averages(d, 0, 1000),
+                        lambda d: mt_biotek.endpoint_averages(d, 2)]:
+            expected = average(df)
+            result = average(compact_df)
+            assert len(result) == len(expected)
+            assert np.allclose(result.Measurement, expected.Measurement,
+                               equal_nan = True)
+            assert list(result.Well.astype(str)) == list(expected.Well)
+
+    def test_endpoint_averages(self):
+        '''
+        Checks endpoint averages, including windows longer than the data.
+        '''
+        avg_df = mt_biotek.endpoint_averages(self.df, 2)
+        a4_gfp = self.df[(self.df.Well == "A4") & (self.df.Gain == 100)]
+        row = avg_df[(avg_df.Well == "A4") & (avg_df.Gain == 100)]
+        assert row.Measurement.iloc[0] == \
+               pytest.approx(a4_gfp.Measurement.iloc[-2:].mean())
+        all_df = mt_biotek.endpoint_averages(self.df, 10)
+        row = all_df[(all_df.Well == "A4") & (all_df.Gain == 100)]
+        assert row.Measurement.iloc[0] == \
+               pytest.approx(a4_gfp.Measurement.mean())
+
+    def test_spline_fit(self):
+        '''
+        Checks spline fits and derivatives, in series and in parallel.
+        '''
+        df = self.growth_df([(0.8, 0.6, 0.09, 0.01), (1.5, 1.0, 0.05, 0.002)])
+        df = df[~((df.Well == "A2") & (df["Time (hr)"] > 15))].copy()
+        df["Measurement"] = np.where(df.Well == "A1",
+                                     1 + 2 * df["Time (hr)"]**2, 3.0)
+        # Shuffle rows to check that each series is sorted by time.
+        df = df.sample(frac = 1, random_state = 0)
+        splined = mt_biotek.spline_fit(df, smoothing_factor = 0,
+                                       derivatives = True)
+        assert splined.index.equals(df.index)
+        assert np.allclose(splined["spline fit"], df.Measurement)
+        expected = np.where(df.Well == "A1", 4 * df["Time (hr)"], 0) / 3600.0
+        assert np.allclose(splined["spline derivative"], expected)
+
+        pooled = mt_biotek.spline_fit(df, smoothing_factor = 0, workers = 2,
+                                      chunksize = 1)
+        assert np.all(pooled["spline fit"] == splined["spline fit"])
+        assert not "spline derivative" in pooled.columns
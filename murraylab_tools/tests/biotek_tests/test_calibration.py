@@ -0,0 +1,65 @@
+import os
+import numpy as np
+
+import murraylab_tools.biotek as mt_biotek
+
+class TestCalibrationTable():
+
+    calibration_lines = ["Fluorophore,Date,Biotek,Gain,AFU per uM",
+                         "deGFP,10/04/14,1,61,1000",
+                         "deGFP,06/23/18,1,61,2000",
+                         "deGFP,06/23/18,3,100,5000",
+                         "mRFP,10/04/14,1,100,400"]
+
+    def write_calibration(self, tmpdir):
+        filename = str(tmpdir.join("calibration.csv"))
+        with open(filename, 'w') as calibration_file:
+            calibration_file.write("\n".join(self.calibration_lines) + "\n")
+        return filename
+
+    def test_most_recent(self, tmpdir):
+        '''
+        Checks that the most recent calibration of each fluorophore is used.
+        '''
+        filename = self.write_calibration(tmpdir)
+        calibration_dict = mt_biotek.calibration_data(filename = filename)
+        assert calibration_dict == {"deGFP": {"date": "06/23/18",
+                                              "b1": {61: 2000},
+                                              "b3": {100: 5000}},
+                                    "mRFP":  {"date": "10/04/14",
+                                              "b1": {100: 400}}}
+
+    def test_cache(self, tmpdir):
+        '''
+        Checks that tables are cached, and re-read when the file changes.
+        '''
+        filename = self.write_calibration(tmpdir)
+        table = mt_biotek.calibration_table(filename = filename)
+        assert mt_biotek.calibration_table(filename = filename) is table
+        assert mt_biotek.calibration_table(date = "10/04/14",
+                                           filename = filename) is not table
+
+        self.calibration_lines.append("mRFP,10/04/14,2,100,800")
+        self.write_calibration(tmpdir)
+        self.calibration_lines.pop()
+        stat = os.stat(filename)
+        os.utime(filename, (stat.st_atime, stat.st_mtime + 10))
+        new_table = mt_biotek.calibration_table(filename = filename)
+        assert new_table is not table
+        assert new_table.factor("mRFP", "b2", 100) == 800
+
+    def test_to_uM(self, tmpdir):
+        '''
+        Checks that array conversion matches raw_to_uM, including overflows
+        and case-insensitive channel names.
+        '''
+        filename = self.write_calibration(tmpdir)
+        table = mt_biotek.calibration_table(filename = filename)
+        calibration_dict = mt_biotek.calibration_data(filename = filename)
+        raw = np.array([["10", "OVRFLW"], ["0", "12345"]])
+        uM = table.to_uM(raw, "DEGFP", "b3", 100, 10.0)
+        assert uM.shape == raw.shape
+        for reading, converted in zip(raw.flat, uM.flat):
+            assert converted == mt_biotek.raw_to_uM(calibration_dict, reading,
+                                                    "deGFP", "b3", 100, 10.0)
+        assert table.to_uM(raw, "deGFP", "b3", 61, 10.0) is None
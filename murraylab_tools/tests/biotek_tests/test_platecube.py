@@ -0,0 +1,87 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+import murraylab_tools.biotek as mt_biotek
+
+class TestPlateCube():
+
+    test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+    df = mt_biotek.tidy_biotek_df(os.path.join(test_dir, "small_plate.csv"),
+                    os.path.join(test_dir, "small_plate_supplementary.csv"),
+                    volume = 10.0)
+
+    def test_round_trip(self):
+        '''
+        Checks that converting to a cube and back doesn't change the data.
+        '''
+        cube = mt_biotek.PlateCube.from_tidy(self.df)
+        assert cube.shape == (3, 6, 4)
+        assert list(cube.well_info.columns) == ["Well", "Construct",
+                                                "ATC (nM)"]
+        assert np.all(self.df.Measurement.to_numpy()[cube.rows[cube.mask]] \
+                      == cube.data[cube.mask])
+        assert np.all(cube.rows[~cube.mask] == -1)
+        tidy_df = cube.to_tidy()
+        assert list(tidy_df.columns) == list(self.df.columns)
+        sort_cols = ["ChanStr", "Well", "Time (sec)"]
+        pd.testing.assert_frame_equal(
+            tidy_df.sort_values(sort_cols).reset_index(drop = True),
+            self.df.sort_values(sort_cols).reset_index(drop = True))
+
+    def test_select(self):
+        '''
+        Checks that single channels are pulled out with times aligned.
+        '''
+        cube = mt_biotek.PlateCube.from_tidy(self.df)
+        od = cube.select("OD600")
+        a2 = self.df[(self.df.Channel == "OD600") & (self.df.Well == "A2")]
+        assert np.all(od[1] == a2.Measurement.to_numpy())
+        od_idx = cube.channel_index("OD600")
+        assert np.all(cube.times[od_idx, 1] == a2["Time (sec)"].to_numpy())
+        with pytest.raises(ValueError):
+            cube.select("deGFP")
+        assert cube.select("deGFP", 100).shape == (6, 4)
+
+    def test_ragged(self):
+        '''
+        Checks that series of different lengths are padded and masked.
+        '''
+        df = self.df[~((self.df.Well == "A1") & \
+                       (self.df["Time (sec)"] > 1000))]
+        cube = mt_biotek.PlateCube.from_tidy(df, grouping_variables = \
+                                                    ["Construct"])
+        assert cube.mask.sum() == len(df)
+        assert np.isnan(cube.data[~cube.mask]).all()
+        assert len(cube.to_tidy()) == len(df)
+
+    def test_empty(self):
+        '''
+        Checks that an empty frame gives an empty cube.
+        '''
+        cube = mt_biotek.PlateCube.from_tidy(self.df.iloc[:0])
+        assert cube.shape == (0, 0, 0)
+        assert len(cube.to_tidy()) == 0
+
+    def test_missing_grouping_values(self):
+        '''
+        Checks that rows with a missing grouping variable are left out, as
+        grouped analyses have always done.
+        '''
+        df = self.df.copy()
+        df.loc[df.Well == "A2", "Construct"] = np.nan
+        cube = mt_biotek.PlateCube.from_tidy(df, grouping_variables = \
+                                                    ["Construct"])
+        assert cube.shape == (3, 5, 4)
+        assert cube.mask.sum() == (df.Well != "A2").sum()
+        assert np.all(df.Measurement.to_numpy()[cube.rows[cube.mask]] \
+                      == cube.data[cube.mask])
+        assert not "A2" in cube.well_info.Well.tolist()
+
+        smoothed = mt_biotek.moving_average_fit(df, window_size = 3,
+                                                units = "index",
+                                                grouping_variables = \
+                                                    ["Construct"])
+        assert len(smoothed) == 3 * 5 * 2
+        assert not "A2" in smoothed.Well.tolist()
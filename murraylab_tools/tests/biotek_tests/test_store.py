@@ -0,0 +1,74 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+import murraylab_tools.biotek as mt_biotek
+
+class TestBiotekStore():
+
+    test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+    df = mt_biotek.tidy_biotek_df(os.path.join(test_dir, "small_plate.csv"),
+                    os.path.join(test_dir, "small_plate_supplementary.csv"),
+                    volume = 10.0)
+
+    def test_round_trip(self, tmpdir):
+        '''
+        Checks that a plate comes back out of the store unchanged, including
+        after reopening it, and that plate IDs can't be silently reused.
+        '''
+        filename = str(tmpdir.join("store.db"))
+        with mt_biotek.BiotekStore(filename) as store:
+            store.add(self.df, "plate1")
+            with pytest.raises(ValueError):
+                store.add(self.df, "plate1")
+            store.add(self.df.iloc[:10], "plate1", replace = True)
+            assert list(store.plates().Rows) == [10]
+            store.add(self.df, "plate1", replace = True)
+
+        with mt_biotek.BiotekStore(filename) as store:
+            assert store.metadata_columns == ["Construct", "ATC (nM)"]
+            df = store.query()
+            assert (df.Plate == "plate1").all()
+            pd.testing.assert_frame_equal(df.drop("Plate", axis = 1),
+                                          self.df)
+
+    def test_query(self):
+        '''
+        Checks that filters, time windows and endpoints pick out the same rows
+        as filtering in pandas, across plates.
+        '''
+        store = mt_biotek.BiotekStore(":memory:")
+        plates_df = pd.concat([self.df.assign(Plate = "p1"),
+                               self.df.assign(Plate = "p2")],
+                              ignore_index = True)
+        store.add(plates_df)
+        assert list(store.plates().Plate) == ["p1", "p2"]
+
+        df = store.query(channel = "deGFP", gain = 61,
+                         metadata = {"ATC (nM)": [0, 10]})
+        expected = plates_df[(plates_df.Channel == "deGFP") \
+                             & (plates_df.Gain == 61) \
+                             & plates_df["ATC (nM)"].isin([0, 10])]
+        assert len(df) > 0
+        assert np.all(df.Measurement.to_numpy() \
+                      == expected.Measurement.to_numpy())
+
+        df = store.query(plates = "p2", start = 0.1, end = 0.3,
+                         units = "hours", columns = ["Well", "Time (hr)"])
+        assert list(df.columns) == ["Well", "Time (hr)"]
+        in_window = (self.df["Time (hr)"] >= 0.1) \
+                    & (self.df["Time (hr)"] <= 0.3)
+        assert len(df) == in_window.sum()
+
+        df = store.query(channel = "OD600", endpoints = True)
+        od = plates_df[plates_df.Channel == "OD600"]
+        last = od["Time (sec)"] == od.groupby(["Plate", "Well"])\
+                                     ["Time (sec)"].transform("max")
+        assert np.all(df.Measurement.to_numpy() \
+                      == od[last].Measurement.to_numpy())
+
+        with pytest.raises(ValueError):
+            store.query(metadata = {"Strain": "JM109"})
+        with pytest.raises(ValueError):
+            store.query(units = "index")
@@ -0,0 +1,392 @@
+import os
+import csv
+import datetime
+import shutil
+import pytest
+import numpy as np
+import pandas as pd
+
+import murraylab_tools.biotek as mt_biotek
+
+class TestTidyBiotekData():
+
+    test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+    def tidy_copy(self, tmpdir, *args, **kwargs):
+        '''
+        Copies the small test plate into a temporary directory and tidies it
+        there, returning the name of the tidy file.
+        '''
+        input_filename = str(tmpdir.join("small_plate.csv"))
+        shutil.copy(os.path.join(self.test_dir, "small_plate.csv"),
+                    input_filename)
+        mt_biotek.tidy_biotek_data(input_filename, *args, **kwargs)
+        return str(tmpdir.join("small_plate_tidy.csv"))
+
+    def compare_files(self, output_filename, reference_filename):
+        with open(os.path.join(self.test_dir, reference_filename), 'r') \
+                as reference_file:
+            with open(output_filename, 'r') as output_file:
+                assert output_file.read() == reference_file.read()
+
+    def test_tidy_AFU(self, tmpdir):
+        '''
+        Checks that raw AFU output (including an overflowed well) matches a
+        known-good tidy file.
+        '''
+        output_filename = self.tidy_copy(tmpdir)
+        self.compare_files(output_filename, "small_plate_AFU_tidy.csv")
+
+    def test_tidy_uM_with_supplementary(self, tmpdir):
+        '''
+        Checks conversion to uM and addition of supplementary data, including
+        dropping wells that have no supplementary data.
+        '''
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        with pytest.warns(UserWarning) as record:
+            output_filename = self.tidy_copy(tmpdir, supplementary_filename,
+                                             convert_to_uM = True)
+        self.compare_files(output_filename, "small_plate_uM_tidy.csv")
+        # One warning for the whole file, not one per block or cell.
+        dropped_warnings = [str(w.message) for w in record \
+                            if "No supplementary data" in str(w.message)]
+        assert dropped_warnings == ["No supplementary data for 3 well(s) " \
+                                    "(A7, A8, A9); throwing out data for " \
+                                    "those wells."]
+
+    def test_tidy_df_matches_csv(self, tmpdir):
+        '''
+        Checks that the in-memory tidier returns the same data, with the same
+        dtypes, as reading the tidy CSV back in.
+        '''
+        input_filename = os.path.join(self.test_dir, "small_plate.csv")
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        for args, kwargs, reference_filename in \
+                [((), {}, "small_plate_AFU_tidy.csv"),
+                 ((supplementary_filename,), {"convert_to_uM": True},
+                  "small_plate_uM_tidy.csv")]:
+            df = mt_biotek.tidy_biotek_df(input_filename, *args, **kwargs)
+            reference_df = pd.read_csv(os.path.join(self.test_dir,
+                                                    reference_filename))
+            pd.testing.assert_frame_equal(df, reference_df)
+        assert not os.path.exists(os.path.join(self.test_dir,
+                                               "small_plate_tidy.csv"))
+
+    def test_tidy_df_save_csv(self, tmpdir):
+        '''
+        Checks that the in-memory tidier can also write the usual tidy CSV.
+        '''
+        input_filename = str(tmpdir.join("small_plate.csv"))
+        shutil.copy(os.path.join(self.test_dir, "small_plate.csv"),
+                    input_filename)
+        mt_biotek.tidy_biotek_df(input_filename, save_csv = True)
+        self.compare_files(str(tmpdir.join("small_plate_tidy.csv")),
+                           "small_plate_AFU_tidy.csv")
+
+    def test_tidy_parallel_blocks(self, tmpdir):
+        '''
+        Checks that tidying blocks in worker processes gives the same file,
+        and the same warnings, as tidying them in order.
+        '''
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        with pytest.warns(UserWarning, match = "No supplementary data"):
+            output_filename = self.tidy_copy(tmpdir, supplementary_filename,
+                                             convert_to_uM = True,
+                                             workers = 2)
+        self.compare_files(output_filename, "small_plate_uM_tidy.csv")
+        df = mt_biotek.tidy_biotek_df(str(tmpdir.join("small_plate.csv")),
+                                      workers = 2)
+        reference_df = pd.read_csv(os.path.join(self.test_dir,
+                                                "small_plate_AFU_tidy.csv"))
+        pd.testing.assert_frame_equal(df, reference_df)
+        assert not os.path.exists(str(tmpdir.join("small_plate_blocks.json")))
+
+    def test_tidy_excel(self, tmpdir):
+        '''
+        Checks that an Excel export is tidied straight from the workbook, to
+        the same data as the CSV export, without leaving a CSV behind.
+        '''
+        openpyxl = pytest.importorskip("openpyxl")
+        def excel_value(text):
+            try:
+                h, m, s = [int(part) for part in text.split(":")]
+                return datetime.time(h, m, s)
+            except ValueError:
+                pass
+            for number_type in [int, float]:
+                try:
+                    return number_type(text)
+                except ValueError:
+                    pass
+            return text if text else None
+
+        workbook = openpyxl.Workbook()
+        with open(os.path.join(self.test_dir, "small_plate.csv"),
+                  encoding = "latin-1", newline = "") as csv_file:
+            for row in csv.reader(csv_file):
+                workbook.active.append([excel_value(v) for v in row])
+        input_filename = str(tmpdir.join("small_plate.xlsx"))
+        workbook.save(input_filename)
+
+        mt_biotek.tidy_biotek_data(input_filename)
+        self.compare_files(str(tmpdir.join("small_plate_tidy.csv")),
+                           "small_plate_AFU_tidy.csv")
+        assert not os.path.exists(str(tmpdir.join("small_plate.csv")))
+
+    @pytest.mark.parametrize("file_format", ["parquet", "feather"])
+    def test_columnar_round_trip(self, tmpdir, file_format):
+        '''
+        Checks that columnar tidy files can be written and read back without
+        changing the data.
+        '''
+        pytest.importorskip("pyarrow")
+        input_filename = str(tmpdir.join("small_plate.csv"))
+        shutil.copy(os.path.join(self.test_dir, "small_plate.csv"),
+                    input_filename)
+        mt_biotek.tidy_biotek_data(input_filename, file_format = file_format)
+        tidy_filename = str(tmpdir.join("small_plate_tidy." + file_format))
+        df = mt_biotek.read_tidy_biotek_data([tidy_filename, tidy_filename])
+        assert df.Channel.dtype.name == "category"
+        reference_df = pd.read_csv(os.path.join(self.test_dir,
+                                                "small_plate_AFU_tidy.csv"))
+        reference_df = pd.concat([reference_df, reference_df],
+                                 ignore_index = True)
+        pd.testing.assert_frame_equal(df, reference_df,
+                                      check_categorical = False,
+                                      check_dtype = False)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_tidy_many(self, workers):
+        '''
+        Checks that a batch of files is tidied into one frame with a plate
+        column, and that a bad file is reported without sinking the batch.
+        '''
+        input_filename = os.path.join(self.test_dir, "small_plate.csv")
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        missing_filename = os.path.join(self.test_dir, "no_such_plate.csv")
+        with pytest.warns(UserWarning, match = "no_such_plate"):
+            df = mt_biotek.tidy_many([input_filename, missing_filename,
+                                      input_filename],
+                                     supplementary = supplementary_filename,
+                                     workers = workers, volume = 10.0,
+                                     convert_to_uM = True)
+        reference_df = pd.read_csv(os.path.join(self.test_dir,
+                                                "small_plate_uM_tidy.csv"))
+        assert len(df) == 2 * len(reference_df)
+        assert (df.Plate == "small_plate").all()
+        pd.testing.assert_frame_equal(df.iloc[:len(reference_df)]\
+                                        .drop("Plate", axis = 1),
+                                      reference_df)
+
+        with pytest.raises(IOError):
+            mt_biotek.tidy_many([missing_filename], workers = workers,
+                                volume = 10.0, errors = "raise")
+
+    def test_compact(self, capsys):
+        '''
+        Checks that compacting a tidy DataFrame shrinks its dtypes without
+        changing its values, and reports memory use.
+        '''
+        input_filename = os.path.join(self.test_dir, "small_plate.csv")
+        df = mt_biotek.tidy_biotek_df(input_filename, volume = 10.0)
+        compact_df = mt_biotek.compact_tidy_df(df, report = True)
+        assert "MB ->" in capsys.readouterr().out
+        for name in ["Channel", "Well", "Units", "ChanStr"]:
+            assert compact_df[name].dtype.name == "category"
+        assert compact_df["Time (sec)"].dtype.kind == "i"
+        assert compact_df.Measurement.dtype == np.float64
+        assert np.isinf(compact_df.Measurement).sum() == 1
+        assert compact_df.memory_usage(deep = True).sum() \
+                < df.memory_usage(deep = True).sum()
+        pd.testing.assert_frame_equal(compact_df, df, check_dtype = False,
+                                      check_categorical = False)
+        pd.testing.assert_frame_equal(mt_biotek.tidy_biotek_df(input_filename,
+                                                               volume = 10.0,
+                                                               compact = True),
+                                      compact_df)
+
+    def test_tailer(self, tmpdir):
+        '''
+        Checks that following a file as it's written, in pieces that split
+        lines (and line endings), gives the same data as tidying it all at
+        once.
+        '''
+        raw_filename = os.path.join(self.test_dir, "small_plate.csv")
+        with open(raw_filename, 'rb') as raw_file:
+            raw = raw_file.read()
+        full_df = mt_biotek.tidy_biotek_df(raw_filename, volume = 10.0)
+
+        input_filename  = str(tmpdir.join("growing.csv"))
+        output_filename = str(tmpdir.join("growing_tidy.csv"))
+        open(input_filename, 'wb').close()
+        tailer = mt_biotek.BiotekTailer(input_filename, volume = 10.0,
+                                        output_filename = output_filename)
+        n_rows = 0
+        for end in list(range(0, len(raw), 97)) + [raw.index(b"\r\n") + 1,
+                                                   len(raw)]:
+            with open(input_filename, 'wb') as growing_file:
+                growing_file.write(raw[:max(end, tailer.offset)])
+            n_rows += len(tailer.update())
+        assert tailer.offset == len(raw)
+        assert n_rows == len(full_df)
+        pd.testing.assert_frame_equal(tailer.df, full_df)
+        self.compare_files(output_filename, "small_plate_AFU_tidy.csv")
+
+        # Nothing new, nothing returned.
+        assert len(tailer.update()) == 0
+
+        # Rewriting the file starts over.
+        with open(input_filename, 'wb') as growing_file:
+            growing_file.write(raw.replace(b"Software Version",
+                                           b"Software Versoin"))
+        with pytest.warns(UserWarning, match = "rewritten"):
+            assert len(tailer.update()) == len(full_df)
+        pd.testing.assert_frame_equal(tailer.df, full_df)
+
+    def test_read_channel(self, tmpdir):
+        '''
+        Checks that reading one channel through the block index gives the same
+        data as tidying the whole file, and that the index is cached.
+        '''
+        input_filename = str(tmpdir.join("small_plate.csv"))
+        shutil.copy(os.path.join(self.test_dir, "small_plate.csv"),
+                    input_filename)
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        full_df = mt_biotek.tidy_biotek_df(input_filename,
+                                           supplementary_filename,
+                                           volume = 10.0)
+
+        index = mt_biotek.index_biotek_file(input_filename)
+        assert list(zip(index.Channel, index.Gain)) == \
+                [("OD600", -1), ("deGFP", 61), ("deGFP", 100)]
+        index_filename = str(tmpdir.join("small_plate_blocks.json"))
+        assert os.path.exists(index_filename)
+        mtime = os.stat(index_filename).st_mtime_ns
+        for channel, gain in [("OD600", None), ("deGFP", 61), ("deGFP", 100)]:
+            df = mt_biotek.read_channel(input_filename, channel, gain,
+                                        supplementary_filename,
+                                        volume = 10.0)
+            expected = full_df[(full_df.Channel == channel) & \
+                               ((full_df.Gain == gain) if gain else True)]
+            pd.testing.assert_frame_equal(df,
+                                          expected.reset_index(drop = True))
+        assert os.stat(index_filename).st_mtime_ns == mtime
+
+        with pytest.raises(ValueError):
+            mt_biotek.read_channel(input_filename, "deGFP")
+        with pytest.raises(ValueError):
+            mt_biotek.read_channel(input_filename, "mRFP")
+
+    def test_tidy_cache(self, tmpdir, monkeypatch):
+        '''
+        Checks that repeat tidying is served from the cache, that options and
+        file contents are part of the key, and eviction and invalidation.
+        '''
+        input_filename = str(tmpdir.join("small_plate.csv"))
+        shutil.copy(os.path.join(self.test_dir, "small_plate.csv"),
+                    input_filename)
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        cache = mt_biotek.TidyCache(str(tmpdir.join("cache")))
+        df = mt_biotek.tidy_biotek_df(input_filename, supplementary_filename,
+                                      volume = 10.0, cache = cache)
+        assert len(os.listdir(cache.directory)) == 1
+
+        def no_tidying(*args, **kwargs):
+            raise AssertionError("Re-tidied a cached file.")
+        with monkeypatch.context() as patch:
+            patch.setattr(mt_biotek.biotek, "_tidy_biotek_df", no_tidying)
+            cached_df = mt_biotek.tidy_biotek_df(input_filename,
+                                                 supplementary_filename,
+                                                 volume = 10.0, cache = cache)
+        pd.testing.assert_frame_equal(cached_df, df)
+
+        uM_df = mt_biotek.tidy_biotek_df(input_filename,
+                                         supplementary_filename,
+                                         volume = 10.0, convert_to_uM = True,
+                                         cache = cache)
+        assert not uM_df.Measurement.equals(df.Measurement)
+        assert len(os.listdir(cache.directory)) == 2
+        with open(input_filename, 'a') as input_file:
+            input_file.write("\n")
+        mt_biotek.tidy_biotek_df(input_filename, supplementary_filename,
+                                 volume = 10.0, cache = cache)
+        assert len(os.listdir(cache.directory)) == 3
+
+        assert cache.invalidate(input_filename) == 1
+        assert cache.invalidate() == 2
+        assert len(os.listdir(cache.directory)) == 0
+
+        # A cache with room for one entry keeps only the latest.
+        cache.max_bytes = 1
+        mt_biotek.tidy_biotek_df(input_filename, volume = 10.0, cache = cache)
+        mt_biotek.tidy_biotek_df(input_filename, supplementary_filename,
+                                 volume = 10.0, cache = cache)
+        assert len(os.listdir(cache.directory)) == 1
+        pd.testing.assert_frame_equal(cache.get(os.listdir(cache.directory)[0]\
+                                                .rsplit(".", 1)[0]), df)
+
+        # A corrupt entry is treated as a miss and replaced.
+        entry = os.path.join(cache.directory, os.listdir(cache.directory)[0])
+        for garbage in (b"not a pickle", b"\x80\x04\x95", b""):
+            with open(entry, 'wb') as entry_file:
+                entry_file.write(garbage)
+            assert cache.get(os.path.basename(entry).rsplit(".", 1)[0]) is None
+            assert not os.path.exists(entry)
+            with open(entry, 'wb') as entry_file:
+                entry_file.write(garbage)
+            redone_df = mt_biotek.tidy_biotek_df(input_filename,
+                                                 supplementary_filename,
+                                                 volume = 10.0, cache = cache)
+            pd.testing.assert_frame_equal(redone_df, df)
+            pd.testing.assert_frame_equal(pd.read_pickle(entry), df)
+
+    def test_parse_times(self):
+        '''
+        Checks that a block's timestamps, in both plain and Excel 1900-style
+        (day rollover) forms, are parsed the same as one at a time.
+        '''
+        raw_times = ["0:02:25", "12:07:25", "23:59:59", "25:00:00",
+                     "1900-01-01 00:04:05", "1900-01-01 13:00:00",
+                     "1900-01-02 01:02:03", "1/1/1900 02:00:00"]
+        seconds = mt_biotek.biotek._parse_biotek_times(raw_times)
+        assert seconds.dtype.kind == "i"
+        assert list(seconds) == [145, 43645, 86399, 90000, 86645, 133200,
+                                 176523, 93600]
+        assert list(seconds) == [mt_biotek.biotek._parse_biotek_time(t) \
+                                 for t in raw_times]
+        assert len(mt_biotek.biotek._parse_biotek_times([])) == 0
+
+    def test_iter_blocks(self):
+        '''
+        Checks that iterating over blocks, whole or in pieces, gives the same
+        data as tidying the whole file, and that dense blocks line up.
+        '''
+        input_filename = os.path.join(self.test_dir, "small_plate.csv")
+        supplementary_filename = os.path.join(self.test_dir,
+                                          "small_plate_supplementary.csv")
+        full_df = mt_biotek.tidy_biotek_df(input_filename,
+                                           supplementary_filename,
+                                           volume = 10.0)
+        for timepoints, n_pieces in [(None, 3), (3, 6), (1, 12)]:
+            dfs = list(mt_biotek.iter_biotek_blocks(input_filename,
+                                                    supplementary_filename,
+                                                    volume = 10.0,
+                                                    timepoints = timepoints))
+            assert len(dfs) == n_pieces
+            pd.testing.assert_frame_equal(pd.concat(dfs, ignore_index = True),
+                                          full_df)
+
+        cubes = list(mt_biotek.iter_biotek_blocks(input_filename,
+                                                  volume = 10.0,
+                                                  timepoints = 3,
+                                                  dense = True))
+        assert [cube.shape for cube in cubes] == [(1, 9, 3), (1, 9, 1)] * 3
+        od = full_df[full_df.Channel == "OD600"]
+        assert np.all(cubes[0].data[0, 0] == \
+                      od[od.Well == "A1"].Measurement.to_numpy()[:3])
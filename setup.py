@@ -84,6 +84,8 @@ setup(
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
+        'columnar': ['pyarrow'],
+        'excel': ['openpyxl'],
         # 'dev': ['check-manifest'],
         # 'test': ['coverage'],
     },